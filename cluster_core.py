@@ -0,0 +1,1403 @@
+""" 星團洗石的核心邏輯：詞綴載入/比對、設定檔、輸入後端與 worker
+
+不匯入任何 GUI / 輸入套件 (真正的輸入後端在建立時才匯入)，
+基準測試、分析工具、命令列版本都可以在沒有桌面環境的機器上直接使用。
+"""
+import json
+import atexit
+import collections
+import functools
+import gzip
+import hashlib
+import mmap
+import pickle
+import queue
+import shutil
+import threading
+import time
+import re
+import os
+import sys
+import random
+from datetime import datetime
+
+
+# ---------- 設定 ----------
+# 判斷是否為打包後的環境 (Frozen/EXE)
+if getattr(sys, 'frozen', False):
+    BASE_DIR = os.path.dirname(sys.executable)
+else:
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MOD_FILE = os.path.join(BASE_DIR, "stats.ndjson")
+CONFIG_FILE = os.path.join(BASE_DIR, "config.json")
+LOG_FILE = os.path.join(BASE_DIR, "roll_log.txt")
+# 篩選後詞綴表的快取檔放在 stats.ndjson 旁邊，格式改變時遞增版本
+MOD_CACHE_SUFFIX = ".cache"
+MOD_CACHE_VERSION = 2
+# 詞綴表載入方式: "eager" 全部解碼；"mmap" 只建位置索引，選到時才解碼
+MOD_LOAD_MODES = ("eager", "mmap")
+# config.json 沒有 "mod_filter_keywords" 時使用的星團詞綴篩選
+DEFAULT_MOD_FILTER_KEYWORDS = {
+    "ref_startswith": [
+        "Added Small Passive Skills also grant",
+        "1 Added Passive Skill is",
+        "Added Small Passive Skills have"
+    ],
+    "string_contains": [
+        "附加的小天賦給予",
+        "附加的小型天賦給予",
+        "附加的小天賦增加",
+        "1 個附加天賦為"
+    ]
+}
+# 只能手動編輯 config.json 的設定，GUI 存檔時要保留
+HAND_EDITED_CONFIG_KEYS = ("mod_filter_keywords", "mod_load_mode", "input_step_delays", "backend", "roll_history")
+
+# 預設延遲 (秒)
+DELAY_AFTER_CLICK = 0.25
+DELAY_AFTER_COPY = 0.15
+# Ctrl+C 後輪詢剪貼簿的間隔 (秒)，以及逾時後重送 Ctrl+C 的次數
+CLIPBOARD_POLL_INTERVAL = 0.01
+CLIPBOARD_RETRIES = 1
+# roll_log.txt 背景寫入：佇列上限 (行)、累積幾行或幾秒寫一次、超過多大就輪替並壓縮
+LOG_QUEUE_SIZE = 10000
+LOG_FLUSH_LINES = 200
+LOG_FLUSH_INTERVAL = 1.0
+LOG_ROTATE_BYTES = 20 * 1024 * 1024
+# 自動調整延遲 (AIMD)：連續 N 次乾淨讀取就把 click/loop 延遲各減 step 秒，失敗時乘上 backoff
+AUTOTUNE_CLEAN_WINDOW = 10
+AUTOTUNE_STEP = 0.01
+AUTOTUNE_BACKOFF = 1.5
+AUTOTUNE_FLOORS = {"click_delay": 0.03, "copy_delay": 0.05, "loop_delay": 0.0}
+AUTOTUNE_CEILING = 2.0
+# copy_delay 是等待剪貼簿的上限，不適合用減法調；改用最近 N 次實際等待時間的高百分位數加上餘裕
+AUTOTUNE_WAIT_WINDOW = 50
+AUTOTUNE_WAIT_PERCENTILE = 0.95
+AUTOTUNE_WAIT_MARGIN = 0.05
+# 每個輸入動作之間的延遲 (秒)，可在 config.json 的 "input_step_delays" 覆寫
+#   move_settle: 移動滑鼠後到點擊前
+#   after_currency: 右鍵通貨後到左鍵星團前
+#   key_gap: Ctrl+C 各個按鍵事件之間
+DEFAULT_STEP_DELAYS = {"move_settle": 0.01, "after_currency": 0.06, "key_gap": 0.02}
+# --------------------------
+
+stop_event = threading.Event()
+roll_count = 0
+
+# ---------- 檔案 / 模式處理 ----------
+def is_target_mod(mod, filter_config):
+    """ 使用設定檔中的關鍵字來判斷是否為目標詞綴 """
+    ref = mod.get("ref", "")
+    matchers = mod.get("matchers", [])
+    
+    ref_startswith_list = filter_config.get("ref_startswith", [])
+    for keyword in ref_startswith_list:
+        if ref.startswith(keyword):
+            return True
+            
+    string_contains_list = filter_config.get("string_contains", [])
+    for m in matchers:
+        s = m.get("string", "")
+        for keyword in string_contains_list:
+            if keyword in s:
+                return True
+
+    return False
+
+def _mod_cache_key(file_path, filter_config):
+    """ 來源檔的 mtime/size 加上篩選關鍵字的 hash，任何一個變了快取就失效 """
+    st = os.stat(file_path)
+    keywords = json.dumps(filter_config, ensure_ascii=False, sort_keys=True)
+    return (
+        MOD_CACHE_VERSION,
+        st.st_mtime_ns,
+        st.st_size,
+        hashlib.sha1(keywords.encode("utf-8")).hexdigest(),
+    )
+
+
+def _read_mod_cache(cache_path, key):
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached.get("key") == key:
+            return [Mod(*fields) for fields in cached["mods"]]
+    except Exception:
+        # 快取不存在或損毀，重新解析即可
+        pass
+    return None
+
+
+def _write_mod_cache(cache_path, key, mods):
+    tmp_path = cache_path + ".tmp"
+    try:
+        # 只存欄位 tuple，不綁定 Mod 類別所在的模組名稱
+        fields = [mod.fields() for mod in mods]
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"key": key, "mods": fields}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        print(f"寫入詞綴快取失敗: {e}")
+
+
+def _keyword_needles(filter_config):
+    """ 把篩選關鍵字轉成它們在 JSON 文字裡的 bytes 寫法 (含 \\uXXXX 跳脫形式) """
+    keywords = filter_config.get("ref_startswith", []) + filter_config.get("string_contains", [])
+    needles = set()
+    for keyword in keywords:
+        for ensure_ascii in (False, True):
+            encoded = json.dumps(keyword, ensure_ascii=ensure_ascii)[1:-1]
+            needles.add(encoded.encode("utf-8"))
+    return needles
+
+
+def _candidate_line_spans(data, needles):
+    """ 找出原始 bytes 中含有任一關鍵字的行，回傳依檔案順序排列的 (start, end) """
+    starts = set()
+    for needle in needles:
+        pos = data.find(needle)
+        while pos != -1:
+            start = data.rfind(b"\n", 0, pos) + 1
+            starts.add(start)
+            end = data.find(b"\n", pos)
+            if end == -1:
+                break
+            pos = data.find(needle, end + 1)
+    spans = []
+    for start in sorted(starts):
+        end = data.find(b"\n", start)
+        spans.append((start, len(data) if end == -1 else end))
+    return spans
+
+
+def load_mod_list(file_path, filter_config, use_cache=True):
+    mods = []
+    # 如果路徑不存在，直接返回空陣列，讓 GUI 層處理
+    if not os.path.exists(file_path):
+        return mods
+
+    cache_path = file_path + MOD_CACHE_SUFFIX
+    cache_key = None
+    if use_cache:
+        try:
+            cache_key = _mod_cache_key(file_path, filter_config)
+        except OSError:
+            cache_key = None
+        if cache_key is not None:
+            cached = _read_mod_cache(cache_path, cache_key)
+            if cached is not None:
+                return cached
+
+    try:
+        with open(file_path, "rb") as f:
+            data = f.read()
+        # 只解碼原始 bytes 裡出現過關鍵字的行，其餘行不可能通過 is_target_mod
+        for start, end in _candidate_line_spans(data, _keyword_needles(filter_config)):
+            try:
+                mod = json.loads(data[start:end].decode("utf-8"))
+                if is_target_mod(mod, filter_config):
+                    mods.append(Mod.from_json(mod))
+            except Exception:
+                continue
+    except Exception as e:
+        print(f"讀取錯誤: {e}")
+        return []
+
+    if cache_key is not None:
+        _write_mod_cache(cache_path, cache_key, mods)
+    return mods
+
+
+class Mod:
+    """ 載入時就整理好的詞綴紀錄，取代到處傳遞的原始 JSON dict
+
+    strings/negate/values 依 matcher 順序排列；values 是 matcher 的固定值 (沒有則為 None)。
+    """
+
+    __slots__ = ("ref", "desc", "strings", "negate", "values", "trade_ids")
+
+    def __init__(self, ref, desc, strings, negate, values, trade_ids):
+        self.ref = ref
+        self.desc = desc
+        self.strings = strings
+        self.negate = negate
+        self.values = values
+        self.trade_ids = trade_ids
+
+    @classmethod
+    def from_json(cls, record):
+        matchers = record.get("matchers", [])
+        ref = record.get("ref", "")
+        strings = tuple(m.get("string", "") for m in matchers)
+        trade_ids = tuple(
+            trade_id
+            for ids in record.get("trade", {}).get("ids", {}).values()
+            for trade_id in ids
+        )
+        return cls(
+            ref,
+            strings[0] if strings else ref,
+            strings,
+            tuple(bool(m.get("negate")) for m in matchers),
+            tuple(m.get("value") for m in matchers),
+            trade_ids,
+        )
+
+    def fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"Mod({self.ref!r})"
+
+
+class ModTable:
+    """ 全部解碼好的詞綴表；App 透過 desc/ref/strings 取顯示用資料，用 [i] 取完整詞綴 """
+
+    def __init__(self, mods):
+        self._mods = mods
+
+    def __len__(self):
+        return len(self._mods)
+
+    def __getitem__(self, i):
+        return self._mods[i]
+
+    def desc(self, i):
+        return self._mods[i].desc or f"mod{i}"
+
+    def ref(self, i):
+        return self._mods[i].ref
+
+    def strings(self, i):
+        return self._mods[i].strings
+
+    def close(self):
+        pass
+
+
+# 不解碼整筆 JSON，直接從原始 bytes 取出 ref 和 matcher 字串
+_LIGHT_FIELD = re.compile(rb'"(ref|string)":("(?:[^"\\]|\\.)*")')
+
+
+class LazyModTable(ModTable):
+    """ mmap stats.ndjson，只保留每筆的 byte 範圍和 ref/matcher 字串，完整內容用到時才解碼
+
+    注意: Windows 上 mmap 期間無法覆寫 stats.ndjson，更新檔案前請先關閉程式或重新載入。
+    """
+
+    def __init__(self, file_path, filter_config):
+        super().__init__([])
+        self._file = open(file_path, "rb")
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空檔案無法 mmap
+            self._data = b""
+        self._spans = []
+        self._refs = []
+        self._strings = []
+        self._decoded = {}
+
+        for start, end in _candidate_line_spans(self._data, _keyword_needles(filter_config)):
+            light = self._light_record(self._data[start:end])
+            if light is None or not is_target_mod(light, filter_config):
+                continue
+            self._spans.append((start, end))
+            self._refs.append(light.get("ref", ""))
+            self._strings.append(tuple(m.get("string", "") for m in light.get("matchers", [])))
+
+    @staticmethod
+    def _light_record(raw):
+        try:
+            if b'"stats":[' in raw:
+                # resolve 類的巢狀紀錄欄位位置不固定，直接完整解碼
+                return json.loads(raw.decode("utf-8"))
+            ref = None
+            strings = []
+            for field, value in _LIGHT_FIELD.findall(raw):
+                if b"\\" in value:
+                    value = json.loads(value.decode("utf-8"))
+                else:
+                    value = value[1:-1].decode("utf-8")
+                if field == b"ref":
+                    ref = value
+                else:
+                    strings.append({"string": value})
+            if ref is None:
+                return json.loads(raw.decode("utf-8"))
+            return {"ref": ref, "matchers": strings}
+        except Exception:
+            return None
+
+    def __len__(self):
+        return len(self._spans)
+
+    def __getitem__(self, i):
+        mod = self._decoded.get(i)
+        if mod is None:
+            start, end = self._spans[i]
+            mod = Mod.from_json(json.loads(self._data[start:end].decode("utf-8")))
+            self._decoded[i] = mod
+        return mod
+
+    def desc(self, i):
+        strings = self._strings[i]
+        return strings[0] if strings else (self._refs[i] or f"mod{i}")
+
+    def ref(self, i):
+        return self._refs[i]
+
+    def strings(self, i):
+        return self._strings[i]
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+class AffixSearchIndex:
+    """ 詞綴搜尋用的字元 n-gram 倒排索引 (單字 + 雙字，適合中文)
+
+    每筆的 ref 和所有 matcher 字串先轉小寫快取起來；查詢時先用 n-gram 交集縮小候選，
+    再用子字串比對確認，結果和逐筆掃描完全相同。
+    """
+
+    def __init__(self, table):
+        self._texts = []
+        self._postings = {}
+        for i in range(len(table)):
+            # 用 \x00 分隔欄位，避免關鍵字跨欄位命中
+            text = "\x00".join((table.ref(i),) + tuple(table.strings(i))).lower()
+            self._texts.append(text)
+            grams = set(text)
+            grams.update(text[j:j + 2] for j in range(len(text) - 1))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+
+    def search(self, keyword):
+        """ 回傳符合的索引 (由小到大)；keyword 需已轉小寫 """
+        if not keyword:
+            return list(range(len(self._texts)))
+        if len(keyword) == 1:
+            return list(self._postings.get(keyword, []))
+
+        grams = {keyword[j:j + 2] for j in range(len(keyword) - 1)}
+        postings = sorted((self._postings.get(g, []) for g in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return [i for i in sorted(candidates) if keyword in self._texts[i]]
+
+
+def load_mod_table(file_path, filter_config, mode="eager"):
+    """ 依 mode 回傳 ModTable (全部解碼，有快取) 或 LazyModTable (mmap，選到才解碼) """
+    if mode not in MOD_LOAD_MODES:
+        print(f"未知的 mod_load_mode: {mode}，改用 eager")
+    if mode == "mmap" and os.path.exists(file_path):
+        try:
+            return LazyModTable(file_path, filter_config)
+        except Exception as e:
+            print(f"mmap 載入失敗，改用一般載入: {e}")
+    return ModTable(load_mod_list(file_path, filter_config))
+
+
+NUM_PATTERN = r"[-+]?\d*\.?\d+"  # 數字 (包含小數和正負號)
+
+
+def pattern_to_regex_source(pattern):
+    """ 把詞綴字串轉成 regex 原始碼，# 換成捕獲數字的群組 """
+    escaped = re.escape(pattern)
+    escaped = escaped.replace(r"\#", "#")
+    escaped = escaped.replace(r"\ ", r"\s*")
+    return f"({NUM_PATTERN})".join(escaped.split("#"))  # 捕獲數字
+
+
+def pattern_to_regex(pattern):
+    return re.compile(pattern_to_regex_source(pattern))
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_target_pattern(pattern):
+    """ (篩選片段, regex)；check_hit 每次呼叫都會重建 TargetMatcher，所以快取起來 """
+    return literal_fragment(pattern), pattern_to_regex(pattern)
+
+
+def literal_fragment(pattern):
+    """ 詞綴字串裡最長的一段固定文字 (不含 # 和空白)；regex 命中的行一定包含這段字 """
+    return max(pattern.replace("#", " ").split(), key=len, default="")
+
+
+def mod_match_line_with_value(line, compiled_pattern):
+    match = compiled_pattern.search(line)
+    if not match:
+        return None
+    
+    # 沒有捕獲組，代表是沒有 # 的詞綴，直接回傳 True 表示匹配成功
+    if not match.groups():
+        return True
+
+    try:
+        # 從第一個捕獲組中提取數值
+        value = float(match.group(1))
+        return value
+    except (IndexError, ValueError):
+        # 如果沒有捕獲組或轉換失敗，也當作是純文字匹配成功
+        return True
+
+
+def extract_mod_section_from_clipboard(text):
+    if not text:
+        return []
+    sections = text.split("--------")
+    if len(sections) < 2:
+        return []
+    mod_section = sections[-2] if len(sections) >= 2 else text
+    lines = [ln.strip() for ln in mod_section.splitlines() if ln.strip()]
+    return lines
+
+
+class TargetMatcher:
+    """ 開始洗之前把目標詞綴一次編譯好，每次洗只做比對 (targets 在 worker_loop 期間不會變)
+
+    每個 pattern 先取一段固定文字當篩選片段；每次洗把詞綴區塊接成一個字串，
+    片段用 `in` 找 (C 層級的子字串搜尋)，找不到就不必跑 regex。
+    目標一個一個判斷，剩下的目標全中也不夠時提早結束。
+    """
+
+    def __init__(self, target_mods, require_k=None):
+        self.targets = []  # (desc, min, max, ((片段, regex), ...), 去重後的片段)
+        for t in target_mods:
+            mod = t['mod']
+            patterns = tuple(compile_target_pattern(pat) for pat in mod.strings)
+            fragments = tuple({fragment for fragment, _ in patterns})
+            self.targets.append((mod.desc or "??", t.get("min"), t.get("max"), patterns, fragments))
+        # 全部命中 = 需要命中數等於目標數
+        self.required = len(self.targets) if require_k is None else require_k
+
+    def __call__(self, mod_lines):
+        if not self.targets:
+            return False, []
+
+        text = "\n".join(mod_lines)
+        hit_details = []
+        hit_count = 0
+        remaining = len(self.targets)
+        for desc, min_val, max_val, patterns, fragments in self.targets:
+            remaining -= 1
+            detail = None
+            # 同一目標的 matcher 常共用片段，先確認至少有一段出現
+            for fragment in fragments:
+                if fragment in text:
+                    detail = self._match_target(text, mod_lines, desc, min_val, max_val, patterns)
+                    break
+            if detail is not None:
+                hit_count += 1
+                hit_details.append(detail)
+            elif hit_count + remaining < self.required:
+                # 剩下的目標全中也不夠，提早結束
+                return False, hit_details
+
+        return hit_count >= self.required, hit_details
+
+    @staticmethod
+    def _match_target(text, mod_lines, desc, min_val, max_val, patterns):
+        for fragment, p in patterns:
+            if fragment not in text:
+                continue
+            for line in mod_lines:
+                match_result = mod_match_line_with_value(line, p)
+                if match_result is None:
+                    continue
+
+                val = match_result if isinstance(match_result, float) else None
+                # 檢查數值範圍
+                if val is not None:
+                    if min_val is not None and val < min_val:
+                        continue
+                    if max_val is not None and val > max_val:
+                        continue
+                return f"{desc} ({val})" if val is not None else desc
+        return None
+
+
+def check_hit(mod_lines, target_mods, require_k=None):
+    """ 單次比對用；洗石迴圈請改用預先建好的 TargetMatcher """
+    return TargetMatcher(target_mods, require_k)(mod_lines)
+
+# ---------- 詞綴索引 (剪貼簿行 -> stats 項目) ----------
+NUMBER_TOKEN = re.compile(r"[-+]?(?:#|\d*\.?\d+)")
+
+
+def normalize_mod_line(text):
+    """ 去掉所有空白並把數字 (或 #) 換成 #，回傳 (key, 數字字串 list) """
+    numbers = []
+
+    def repl(m):
+        numbers.append(m.group(0))
+        return "#"
+
+    key = NUMBER_TOKEN.sub(repl, "".join(text.split()))
+    return key, numbers
+
+
+class StatIndex:
+    """ 以正規化後的詞綴字串為 key 的索引，一次 dict 查詢就能認出剪貼簿上的一行詞綴
+
+    matcher 字串裡的固定數字 (例如 "每 15 點敏捷") 和 # 一樣會變成 key 裡的 #，
+    同一個 key 的多個項目再用固定數字區分。
+    """
+
+    def __init__(self):
+        self._index = {}  # key -> [(literals, Mod, matcher 位置)]
+
+    def __len__(self):
+        return len(self._index)
+
+    def add(self, mod):
+        for pos, string in enumerate(mod.strings):
+            key, numbers = normalize_mod_line(string)
+            # 每個數字位置: None 代表是 # (要捕獲的值)，否則是固定數字
+            literals = tuple(None if n.endswith("#") else float(n) for n in numbers)
+            self._index.setdefault(key, []).append((literals, mod, pos))
+
+    def identify(self, line):
+        """ 回傳 (Mod, 數值 list)；negate 的 matcher 數值會取負號。認不出來回傳 (None, []) """
+        key, numbers = normalize_mod_line(line)
+        candidates = self._index.get(key)
+        if not candidates:
+            return None, []
+        values = [float(n) for n in numbers]
+        for literals, mod, pos in candidates:
+            if all(lit is None or lit == v for lit, v in zip(literals, values)):
+                captured = [v for lit, v in zip(literals, values) if lit is None]
+                if not captured and mod.values[pos] is not None:
+                    captured = [float(mod.values[pos])]
+                if mod.negate[pos]:
+                    captured = [-v for v in captured]
+                return mod, captured
+        return None, []
+
+
+def load_stat_index(file_path):
+    """ 讀取整個 stats.ndjson (不套用篩選) 建立 StatIndex """
+    index = StatIndex()
+    if not os.path.exists(file_path):
+        return index
+
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    index.add(Mod.from_json(json.loads(line)))
+                except Exception:
+                    continue
+    except Exception as e:
+        print(f"建立詞綴索引錯誤: {e}")
+    return index
+
+
+def identify_mod_lines(mod_lines, stat_index):
+    """ 每一行回傳 (Mod 或 None, 數值 list, 原文) """
+    return [stat_index.identify(line) + (line,) for line in mod_lines]
+
+
+def describe_mod_lines(identified):
+    """ 把 identify_mod_lines 的結果轉成 log 用的文字：認得的寫 ref[數值]，認不得的寫 ?原文 """
+    parts = []
+    for mod, values, line in identified:
+        if mod is None:
+            parts.append(f"?{line}")
+        elif values:
+            parts.append(f"{mod.ref}[{','.join(f'{v:g}' for v in values)}]")
+        else:
+            parts.append(mod.ref)
+    return " ; ".join(parts)
+
+# ---------- IO: config / log ----------
+
+def read_config_file(path=None):
+    """ 直接讀取 config.json (或 path)，不補預設值也不寫檔；檔案不存在回傳 None
+
+    讀取或解析失敗時拋出 OSError / ValueError。load_config 在檔案不存在時會寫出預設值，
+    命令列版本和工具只想讀取時用這個。
+    """
+    path = path or CONFIG_FILE
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _read_config_file():
+    """ 同 read_config_file，但讀取失敗只印出錯誤並回傳 None """
+    try:
+        return read_config_file()
+    except (OSError, ValueError) as e:
+        print(f"載入設定檔錯誤: {e}")
+        return None
+
+
+def save_config(cfg):
+    try:
+        # Preserve hand-edited keys (not shown in the GUI) from the current config on disk
+        # (讀檔本身，不能呼叫 load_config：檔案不存在時兩者會互相遞迴)
+        current_config = _read_config_file()
+        for key in HAND_EDITED_CONFIG_KEYS:
+            if current_config and key in current_config:
+                cfg[key] = current_config[key]
+
+        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
+            json.dump(cfg, f, ensure_ascii=False, indent=2)
+        print(f"成功儲存設定到 {CONFIG_FILE}")
+    except Exception as e:
+        print(f"儲存設定失敗: {e}")
+
+
+def load_config():
+    default_filters = {"mod_filter_keywords": DEFAULT_MOD_FILTER_KEYWORDS}
+    
+    if not os.path.exists(CONFIG_FILE):
+        # 如果設定檔不存在，建立一個包含預設篩選的
+        save_config(default_filters)
+        return default_filters
+
+    cfg = _read_config_file()
+    if cfg is None:
+        return default_filters # 發生錯誤時返回預設值
+    # 如果讀取的設定檔沒有篩選關鍵字，則補上
+    if 'mod_filter_keywords' not in cfg:
+        cfg.update(default_filters)
+        # 馬上存回去
+        save_config(cfg)
+    return cfg
+
+
+
+class RollLogWriter:
+    """ 在背景執行緒批次寫入 roll_log.txt
+
+    write() 只把一行放進有上限的佇列 (滿了才會等待)；背景執行緒保持檔案開啟，
+    累積 LOG_FLUSH_LINES 行或經過 LOG_FLUSH_INTERVAL 秒才寫入一次。
+    檔案超過 LOG_ROTATE_BYTES 時改名為 roll_log.<時間>.txt 並壓縮成 .gz。
+    """
+
+    _STOP = object()
+
+    def __init__(self, path, max_bytes=LOG_ROTATE_BYTES, flush_lines=LOG_FLUSH_LINES,
+                 flush_interval=LOG_FLUSH_INTERVAL, queue_size=LOG_QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._failing = False  # 連續失敗時只印一次錯誤
+        self._thread = threading.Thread(target=self._run, name="roll-log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, line):
+        self._queue.put(line + "\n")
+
+    def flush(self, timeout=None):
+        """ 等到目前佇列中的行都寫進檔案 """
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, str):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.flush_lines:
+                    continue
+            # 行數或時間到了、或收到 flush / stop：寫出目前累積的內容
+            if batch:
+                batch = self._write_batch(batch)
+            deadline = None if not batch else time.monotonic() + self.flush_interval
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is self._STOP:
+                break
+        self._close_file()
+
+    def _write_batch(self, batch):
+        """ 寫入成功回傳空 list；失敗保留 (最多佇列上限的行數) 等下次重試 """
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("".join(batch))
+            self._file.flush()
+        except OSError as e:
+            self._report_failure(f"寫入 {self.path} 失敗: {e}")
+            self._close_file()
+            return batch[-self._queue.maxsize:]
+
+        # 這批已經寫進檔案了，輪替失敗也不能再重寫一次
+        if self.max_bytes:
+            try:
+                if self._file.tell() >= self.max_bytes:
+                    self._rotate()
+            except OSError as e:
+                # 例如 Windows 上別的程式開著 roll_log.txt：繼續寫原檔，下一批再試
+                self._report_failure(f"輪替 {self.path} 失敗: {e}")
+                return []
+        self._failing = False
+        return []
+
+    def _report_failure(self, message):
+        if not self._failing:
+            print(message)
+        self._failing = True
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def _rotate(self):
+        self._close_file()
+        root, ext = os.path.splitext(self.path)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        segment = f"{root}.{stamp}{ext}"
+        n = 1
+        while os.path.exists(segment) or os.path.exists(segment + ".gz"):
+            segment = f"{root}.{stamp}-{n}{ext}"
+            n += 1
+        os.replace(self.path, segment)
+        try:
+            with open(segment, "rb") as src, gzip.open(segment + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(segment)
+        except OSError as e:
+            # 壓縮失敗就保留未壓縮的檔案，內容不會遺失
+            print(f"壓縮 {segment} 失敗: {e}")
+
+
+_roll_log_writer = None
+_roll_log_lock = threading.Lock()
+
+
+def _get_roll_log_writer():
+    """ 第一次寫入時才啟動背景執行緒；LOG_FILE 被改掉 (命令列 --roll-log、工具) 就換一個 writer """
+    global _roll_log_writer
+    with _roll_log_lock:
+        if _roll_log_writer is not None and _roll_log_writer.path != LOG_FILE:
+            _roll_log_writer.close()
+            _roll_log_writer = None
+        if _roll_log_writer is None:
+            _roll_log_writer = RollLogWriter(LOG_FILE)
+        return _roll_log_writer
+
+
+def append_log_line(line):
+    _get_roll_log_writer().write(line)
+
+
+def flush_roll_log(timeout=5.0):
+    """ 把還在佇列中的紀錄寫進檔案 (停止洗石、開啟 log 前呼叫) """
+    if _roll_log_writer is not None:
+        _roll_log_writer.flush(timeout)
+
+
+def close_roll_log():
+    global _roll_log_writer
+    with _roll_log_lock:
+        if _roll_log_writer is not None:
+            _roll_log_writer.close()
+            _roll_log_writer = None
+
+
+atexit.register(close_roll_log)
+
+# ---------- 偏移與點擊 ----------
+
+def resolve_step_delays(overrides=None):
+    """ 預設的每步延遲加上 config 的覆寫值 (忽略未知或非數字的項目) """
+    delays = dict(DEFAULT_STEP_DELAYS)
+    for name, value in (overrides or {}).items():
+        if name in delays and isinstance(value, (int, float)) and value >= 0:
+            delays[name] = float(value)
+    return delays
+
+
+def minimum_roll_time(workflow, click_delay, loop_delay, step_delays):
+    """ 一次洗石中固定會 sleep 的總時間 (不含等待剪貼簿更新與遊戲回應) """
+    if workflow == 'shift':
+        # 游標停在星團上不用移動：左鍵星團 + Ctrl+C (Shift 全程按住)
+        return click_delay + 2 * step_delays["key_gap"] + loop_delay
+    currency_clicks = 2 if workflow == 'double' else 1
+    moves = currency_clicks * 2
+    return (
+        moves * step_delays["move_settle"]
+        + (currency_clicks * 2 - 1) * step_delays["after_currency"]
+        + click_delay
+        + 2 * step_delays["key_gap"]
+        + loop_delay
+    )
+
+
+# ---------- 輸入 / 剪貼簿後端 ----------
+# 後端介面：
+#   滑鼠   move(x, y)、click(button)、position()
+#   鍵盤   key_down(key)、key_up(key)、press(key)
+#   剪貼簿 paste()、copy(text)、clipboard_sequence (可為 None)
+#   提示   alert(text)
+
+class RealBackend:
+    """ 真正操作遊戲：pydirectinput 送輸入、pyautogui 取座標/彈窗、pyperclip 讀寫剪貼簿 """
+
+    name = "real"
+
+    def __init__(self):
+        # 延後到這裡才匯入，dry_run / recording 不需要這些套件 (也不需要桌面環境)
+        import pydirectinput
+        import pyautogui
+        import pyperclip
+        self._input = pydirectinput
+        self._gui = pyautogui
+        self._clipboard = pyperclip
+        # pydirectinput 每個呼叫預設會再 sleep PAUSE (0.1 秒)，延遲改由我們自己控制
+        pydirectinput.PAUSE = 0
+        self.clipboard_sequence = _clipboard_sequence_reader()
+
+    def move(self, x, y):
+        self._input.moveTo(x, y)
+
+    def click(self, button):
+        if button == "left":
+            self._input.leftClick()
+        else:
+            self._input.rightClick()
+
+    def key_down(self, key):
+        self._input.keyDown(key)
+
+    def key_up(self, key):
+        self._input.keyUp(key)
+
+    def press(self, key):
+        self._input.press(key)
+
+    def position(self):
+        return self._gui.position()
+
+    def paste(self):
+        return self._clipboard.paste()
+
+    def copy(self, text):
+        self._clipboard.copy(text)
+
+    def alert(self, text):
+        self._gui.alert(text)
+
+
+# dry_run / recording 在 Ctrl+C 時放進剪貼簿的物品文字；{sequence} 讓每次內容都不同
+DRY_RUN_ITEM_TEXT = (
+    "物品種類: 珠寶\n稀有度: 魔法\n試跑 #{sequence}\n大型星團珠寶\n--------\n"
+    "需求:\n等級: 54\n--------\n物品等級: 84\n--------\n附加 8 個天賦 (enchant)\n--------\n"
+    "1 個附加天賦為鐵匠\n--------\n放置於天賦樹上已配置的大型珠寶插槽。\n"
+)
+
+
+class DryRunBackend:
+    """ 不送出任何輸入；剪貼簿只是記憶體中的字串，用來在沒有遊戲的環境跑 worker
+
+    按住 Ctrl 時 press("c") 會把 item_text 放進剪貼簿並遞增序號，
+    ClipboardWatcher 立刻看到更新，量到的是迴圈本身的時間而不是 copy_delay 逾時。
+    """
+
+    name = "dry_run"
+
+    def __init__(self, clipboard="", item_text=DRY_RUN_ITEM_TEXT):
+        self.clipboard = clipboard
+        self.item_text = item_text
+        self.cursor = (0, 0)
+        self._held = set()
+        self._sequence = 0
+
+    def clipboard_sequence(self):
+        return self._sequence
+
+    def move(self, x, y):
+        self.cursor = (x, y)
+
+    def click(self, button):
+        pass
+
+    def key_down(self, key):
+        self._held.add(key)
+
+    def key_up(self, key):
+        self._held.discard(key)
+
+    def press(self, key):
+        if key == "c" and "ctrl" in self._held:
+            self.copy(self.item_text.format(sequence=self._sequence + 1))
+
+    def position(self):
+        return self.cursor
+
+    def paste(self):
+        return self.clipboard
+
+    def copy(self, text):
+        self.clipboard = text
+        self._sequence += 1
+
+    def alert(self, text):
+        print(f"[alert] {text}")
+
+
+class RecordingBackend(DryRunBackend):
+    """ 同 dry_run，另外把每個事件記成 (perf_counter, 事件, 參數...) 放在 events """
+
+    name = "recording"
+
+    def __init__(self, clipboard="", item_text=DRY_RUN_ITEM_TEXT):
+        super().__init__(clipboard, item_text)
+        self.events = []
+
+    def _record(self, *event):
+        self.events.append((time.perf_counter(),) + event)
+
+    def move(self, x, y):
+        self._record("move", x, y)
+        super().move(x, y)
+
+    def click(self, button):
+        self._record("click", button)
+
+    def key_down(self, key):
+        self._record("key_down", key)
+        super().key_down(key)
+
+    def key_up(self, key):
+        self._record("key_up", key)
+        super().key_up(key)
+
+    def press(self, key):
+        self._record("press", key)
+        super().press(key)
+
+    def paste(self):
+        self._record("paste")
+        return self.clipboard
+
+    def copy(self, text):
+        self._record("copy", len(text))
+        super().copy(text)
+
+    def alert(self, text):
+        self._record("alert", text)
+
+
+BACKENDS = {
+    RealBackend.name: RealBackend,
+    DryRunBackend.name: DryRunBackend,
+    RecordingBackend.name: RecordingBackend,
+}
+DEFAULT_BACKEND = RealBackend.name
+
+
+def create_backend(name=DEFAULT_BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"未知的後端 {name!r}，可用: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+class InputLayer:
+    """ 點擊前讀實際游標位置決定要不要等游標停穩，並記住 Shift 是否按住
+
+    每次點擊都在偏移範圍內重新抖動；游標原本就在範圍內時只做小幅移動，不用再等 move_settle。
+    Shift 的狀態用 lock 保護，因為 ESC 緊急停止需要從其他執行緒放開 Shift。
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._shift_lock = threading.Lock()
+        self._shift_held = False
+
+    def _in_box(self, x, y, offset):
+        # 使用者可能在洗的途中移動滑鼠，所以每次都讀實際位置 (GetCursorPos 很便宜)
+        cx, cy = self.backend.position()
+        return abs(cx - x) <= offset and abs(cy - y) <= offset
+
+    def click(self, x, y, offset=3, button="left", settle=DEFAULT_STEP_DELAYS["move_settle"]):
+        in_box = self._in_box(x, y, offset)
+        self.backend.move(x + random.randint(-offset, offset), y + random.randint(-offset, offset))
+        if not in_box:
+            time.sleep(settle)
+        self.backend.click(button)
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def press_copy(self, key_gap=DEFAULT_STEP_DELAYS["key_gap"]):
+        self.backend.key_down("ctrl")
+        self.sleep(key_gap)
+        self.backend.press("c")
+        self.sleep(key_gap)
+        self.backend.key_up("ctrl")
+
+    def hold_shift(self):
+        with self._shift_lock:
+            if not self._shift_held:
+                self.backend.key_down("shift")
+                self._shift_held = True
+
+    def release_shift(self):
+        """ 放開 Shift；可以重複呼叫，也可以從其他執行緒 (ESC) 呼叫 """
+        with self._shift_lock:
+            if self._shift_held:
+                self.backend.key_up("shift")
+                self._shift_held = False
+
+
+# 目前使用的後端與輸入層，由 use_backend() 設定
+backend = None
+input_layer = None
+
+
+def use_backend(new_backend):
+    """ 切換全域後端；worker 與 ESC 緊急停止都透過 input_layer 操作 """
+    global backend, input_layer
+    backend = new_backend
+    input_layer = InputLayer(new_backend)
+    return new_backend
+
+
+def do_click_sequence(alt_pos, cluster_pos, offset, click_delay, workflow="single", item2_pos=None, step_delays=None, inp=None):
+    steps = step_delays or DEFAULT_STEP_DELAYS
+    settle = steps["move_settle"]
+    inp = inp or input_layer
+    if workflow == 'shift':
+        # 持續套用流程：通貨已在 begin_shift_hold 拿起，每次只需左鍵星團 (游標已在星團上就不用等停穩)
+        inp.click(cluster_pos[0], cluster_pos[1], offset=offset, button="left", settle=settle)
+        inp.sleep(click_delay)
+        # Shift 全程按住：一放開通貨就會從游標上放下，遊戲實際收到的是 Ctrl+Shift+C
+        inp.press_copy(steps["key_gap"])
+        return
+    if workflow == 'double' and item2_pos is not None:
+        # 兩種通貨流程
+        # 1. 右鍵改造石 (通貨A)
+        inp.click(alt_pos[0], alt_pos[1], offset=offset, button="right", settle=settle)
+        inp.sleep(steps["after_currency"])
+        # 2. 左鍵星團
+        inp.click(cluster_pos[0], cluster_pos[1], offset=offset, button="left", settle=settle)
+        inp.sleep(steps["after_currency"])
+        # 3. 右鍵通貨B
+        inp.click(item2_pos[0], item2_pos[1], offset=offset, button="right", settle=settle)
+        inp.sleep(steps["after_currency"])
+        # 4. 左鍵星團
+        inp.click(cluster_pos[0], cluster_pos[1], offset=offset, button="left", settle=settle)
+        inp.sleep(click_delay)
+    else:
+        # 原本的單一通貨流程
+        # 右鍵改造石
+        inp.click(alt_pos[0], alt_pos[1], offset=offset, button="right", settle=settle)
+        inp.sleep(steps["after_currency"])
+        # 左鍵星團
+        inp.click(cluster_pos[0], cluster_pos[1], offset=offset, button="left", settle=settle)
+        inp.sleep(click_delay)
+
+    # 共同的複製步驟
+    inp.press_copy(steps["key_gap"])
+
+
+# ---------- Shift 持續套用 ----------
+
+def release_shift_hold():
+    if input_layer is not None:
+        input_layer.release_shift()
+
+
+def begin_shift_hold(alt_pos, offset, step_delays=None, inp=None):
+    """ 按住 Shift 後右鍵拿起通貨，之後每次左鍵星團都會套用一次 """
+    steps = step_delays or DEFAULT_STEP_DELAYS
+    inp = inp or input_layer
+    inp.hold_shift()
+    inp.sleep(steps["key_gap"])
+    inp.click(alt_pos[0], alt_pos[1], offset=offset, button="right", settle=steps["move_settle"])
+    inp.sleep(steps["after_currency"])
+
+
+def press_copy(key_gap=DEFAULT_STEP_DELAYS["key_gap"], inp=None):
+    inp = inp or input_layer
+    inp.press_copy(key_gap)
+
+
+# ---------- 剪貼簿 ----------
+
+def _clipboard_sequence_reader():
+    """ Windows 有剪貼簿序號可直接判斷是否更新；其他平台回傳 None，改用內容比對 """
+    if sys.platform != "win32":
+        return None
+    try:
+        import ctypes
+        return ctypes.windll.user32.GetClipboardSequenceNumber
+    except Exception:
+        return None
+
+
+class ClipboardWatcher:
+    """ 等剪貼簿真的更新後才讀取，取代 Ctrl+C 後固定 sleep """
+
+    def __init__(self, paste=None, sequence=None):
+        self.paste = paste or backend.paste
+        self.sequence = sequence if sequence is not None else backend.clipboard_sequence
+        self._marker = None
+
+    def mark(self):
+        """ 在送出 Ctrl+C 之前記下目前狀態 """
+        self._marker = self.sequence() if self.sequence else self.paste()
+
+    def wait(self, timeout, poll_interval=CLIPBOARD_POLL_INTERVAL):
+        """ 等到剪貼簿和 mark() 時不同；回傳 (內容, 是否有更新) """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.sequence:
+                if self.sequence() != self._marker:
+                    return self.paste(), True
+            else:
+                text = self.paste()
+                if text != self._marker:
+                    return text, True
+            if time.monotonic() >= deadline or stop_event.is_set():
+                return self.paste(), False
+            time.sleep(poll_interval)
+
+    def read_after_copy(self, timeout, retries=CLIPBOARD_RETRIES, resend=None):
+        """ 等待剪貼簿更新，逾時就重送 Ctrl+C；全部逾時仍回傳目前內容並標記為未更新 """
+        text, changed = self.wait(timeout)
+        for _ in range(retries):
+            if changed or stop_event.is_set():
+                break
+            (resend or press_copy)()
+            text, changed = self.wait(timeout)
+        return text, changed
+
+
+# ---------- 自動調整延遲 ----------
+
+class DelayAutoTuner:
+    """ 用 AIMD 找出每台電腦可持續的最短 click/loop 延遲，copy_delay 依實際等待時間決定
+
+    - stale: 剪貼簿在 copy_delay 內沒更新 -> copy_delay 退回
+    - unchanged / parse: 讀到和上一次相同的內容或沒有詞綴區段，代表太早複製 -> click_delay、loop_delay 退回
+    - 連續 AUTOTUNE_CLEAN_WINDOW 次乾淨讀取 -> click_delay、loop_delay 各減 AUTOTUNE_STEP，
+      copy_delay 改成最近等待時間的 AUTOTUNE_WAIT_PERCENTILE 百分位數 + AUTOTUNE_WAIT_MARGIN
+
+    copy_delay 只是等待上限，剪貼簿一更新就會往下走，把它減小不會變快，
+    只會讓逾時更接近遊戲的實際延遲、多出重送 Ctrl+C 和 stale 退回。
+    """
+
+    BACKOFF_TARGETS = {
+        "stale": ("copy_delay",),
+        "unchanged": ("click_delay", "loop_delay"),
+        "parse": ("click_delay", "loop_delay"),
+    }
+    DECREASE_TARGETS = ("click_delay", "loop_delay")
+
+    def __init__(self, click_delay, copy_delay, loop_delay):
+        self.delays = {"click_delay": click_delay, "copy_delay": copy_delay, "loop_delay": loop_delay}
+        self.clean_streak = 0
+        self.failures = 0
+        self.waits = collections.deque(maxlen=AUTOTUNE_WAIT_WINDOW)
+
+    def record(self, failure=None, clipboard_wait=None):
+        """ 記錄一次讀取結果 (failure 為 None 代表乾淨)；延遲有變動時回傳 True
+
+        clipboard_wait 是這次從送出 Ctrl+C 到讀到剪貼簿的秒數 (含重送)；
+        stale 時它是等到逾時的時間，當作實際延遲的下限一起記錄。
+        """
+        if clipboard_wait is not None:
+            self.waits.append(clipboard_wait)
+        if failure is None:
+            self.clean_streak += 1
+            if self.clean_streak < AUTOTUNE_CLEAN_WINDOW:
+                return False
+            self.clean_streak = 0
+            changed = False
+            for name in self.DECREASE_TARGETS:
+                value = self.delays[name]
+                # 使用者設得比下限還低就維持原值，減少的步驟不能反而把延遲調高
+                new_value = max(min(value, AUTOTUNE_FLOORS[name]), round(value - AUTOTUNE_STEP, 3))
+                changed = changed or new_value != value
+                self.delays[name] = new_value
+            return self._fit_copy_delay() or changed
+
+        self.failures += 1
+        self.clean_streak = 0
+        for name in self.BACKOFF_TARGETS[failure]:
+            # 延遲為 0 時乘法退回沒有作用，至少加回一個 step
+            value = max(self.delays[name] * AUTOTUNE_BACKOFF, self.delays[name] + AUTOTUNE_STEP)
+            self.delays[name] = min(AUTOTUNE_CEILING, round(value, 3))
+        return True
+
+    def _fit_copy_delay(self):
+        if len(self.waits) < AUTOTUNE_CLEAN_WINDOW:
+            return False
+        waits = sorted(self.waits)
+        high = waits[int(AUTOTUNE_WAIT_PERCENTILE * (len(waits) - 1))]
+        value = min(AUTOTUNE_CEILING, max(AUTOTUNE_FLOORS["copy_delay"], round(high + AUTOTUNE_WAIT_MARGIN, 3)))
+        changed = value != self.delays["copy_delay"]
+        self.delays["copy_delay"] = value
+        return changed
+
+    def describe(self):
+        return ", ".join(f"{name}={value:.3f}" for name, value in self.delays.items())
+
+
+# ---------- 背景 worker ----------
+
+def worker_loop(gui_vars):
+    global roll_count
+    stop_event.clear()
+    stat_index = gui_vars.get('stat_index')
+    # 結構化紀錄 (roll_history.RollHistory)，沒有給就只寫 roll_log.txt
+    history = gui_vars.get('history')
+    session_id = gui_vars.get('session_id')
+    # 洗到這個次數就停止 (0 / None = 不限)；在這次結果判斷完之後才檢查
+    max_rolls = gui_vars.get('max_rolls')
+    roll_count = 0
+    clipboard = ClipboardWatcher()
+    delays = {
+        "click_delay": gui_vars['click_delay'],
+        "copy_delay": gui_vars['copy_delay'],
+        "loop_delay": gui_vars.get('loop_delay', 0.2),
+    }
+    tuner = DelayAutoTuner(**delays) if gui_vars.get('autotune') else None
+    if tuner is not None:
+        delays = tuner.delays
+    previous_clip = None
+    step_delays = gui_vars.get('step_delays') or DEFAULT_STEP_DELAYS
+    start_time = datetime.now()
+    gui_vars['append_log']("開始自動洗石: " + start_time.strftime("%Y-%m-%d %H:%M:%S"))
+    min_roll = minimum_roll_time(gui_vars['workflow'], delays['click_delay'], delays['loop_delay'], step_delays)
+    min_roll_msg = f"每次洗石固定延遲合計 {min_roll:.3f} 秒 (不含等待剪貼簿)"
+    if min_roll > 0:
+        min_roll_msg += f"，理論上限約 {60 / min_roll:.0f} 次/分"
+    gui_vars['append_log'](min_roll_msg)
+    try:
+        if gui_vars['workflow'] == 'shift':
+            begin_shift_hold(gui_vars['alt_pos'], gui_vars['offset'], step_delays)
+        while not stop_event.is_set():
+            t_start = time.perf_counter()
+            clipboard.mark()
+            do_click_sequence(
+                gui_vars['alt_pos'], 
+                gui_vars['cluster_pos'], 
+                gui_vars['offset'], 
+                delays['click_delay'], 
+                workflow=gui_vars['workflow'],
+                item2_pos=gui_vars.get('item2_pos'),
+                step_delays=step_delays
+            )
+            roll_count += 1
+            gui_vars['set_count'](roll_count)
+            t_input = time.perf_counter()
+            # copy_delay 現在是等待剪貼簿更新的上限，遊戲回應快就不用等滿
+            clip, fresh = clipboard.read_after_copy(
+                delays['copy_delay'], resend=lambda: press_copy(step_delays["key_gap"])
+            )
+            t_clipboard = time.perf_counter()
+            if not fresh:
+                gui_vars['append_log'](f"[警告] 第 {roll_count} 次剪貼簿未更新 (可能讀到上一次的結果)")
+            mod_lines = extract_mod_section_from_clipboard(clip)
+
+            if tuner is not None:
+                failure = None
+                if not fresh:
+                    failure = "stale"
+                elif clip == previous_clip:
+                    failure = "unchanged"
+                elif not mod_lines:
+                    failure = "parse"
+                if tuner.record(failure, t_clipboard - t_input) and failure is not None:
+                    gui_vars['append_log'](f"[自動延遲] {failure}，退回: {tuner.describe()}")
+            previous_clip = clip
+        
+            hit, hit_details = gui_vars['matcher'](mod_lines)
+            t_match = time.perf_counter()
+            identified = identify_mod_lines(mod_lines, stat_index) if stat_index is not None else None
+            t_identify = time.perf_counter()
+        
+            log_msg = f"[{roll_count}] 讀取 {len(mod_lines)} 行 -> {'HIT' if hit else 'MISS'}"
+            if hit:
+                log_msg += " | " + ", ".join(hit_details)
+            
+            gui_vars['append_log'](log_msg)
+            log_line = f"{datetime.now().isoformat()} | #{roll_count} | HIT={hit} | details={','.join(hit_details)} | lines={len(mod_lines)}"
+            if not fresh:
+                log_line += " | stale=True"
+            if identified is not None:
+                log_line += f" | mods={describe_mod_lines(identified)}"
+            append_log_line(log_line)
+            if history is not None:
+                history.record(session_id, roll_count, time.time(), hit, fresh, identified or [], {
+                    "input": t_input - t_start,
+                    "clipboard": t_clipboard - t_input,
+                    "match": t_match - t_clipboard,
+                    "identify": t_identify - t_match,
+                })
+
+            if hit:
+                # 先放開 Shift 再跳出提示，避免使用者操作時 Shift 還被按著
+                release_shift_hold()
+                gui_vars['append_log']("命中條件，停止腳本。")
+                try:
+                    backend.alert('命中條件，停止腳本！')
+                except Exception as e:
+                    print(f"無法顯示 alert: {e}")
+                stop_event.set()
+            elif max_rolls and roll_count >= max_rolls:
+                gui_vars['append_log'](f"已洗 {roll_count} 次，達到上限，停止。")
+                break
+        
+            time.sleep(delays['loop_delay'])
+    except Exception as e:
+        gui_vars['append_log'](f"[錯誤] 洗石中斷: {e}")
+    finally:
+        release_shift_hold()
+
+    end_time = datetime.now()
+    duration = end_time - start_time
+    gui_vars['append_log']("腳本結束: " + end_time.strftime("%Y-%m-%d %H:%M:%S"))
+    gui_vars['append_log'](f"總共洗了 {roll_count} 次，耗時: {duration}")
+    if tuner is not None:
+        gui_vars['append_log'](f"[自動延遲] 收斂值: {tuner.describe()} (失敗 {tuner.failures} 次)")
+        append_log_line(f"{end_time.isoformat()} | AUTOTUNE | {tuner.describe()} | failures={tuner.failures}")
+        if 'set_delays' in gui_vars:
+            gui_vars['set_delays'](dict(tuner.delays))
+    # 停止時把還在佇列中的紀錄寫進 roll_log.txt
+    flush_roll_log()
+    if history is not None:
+        history.end_session(session_id, roll_count)
+        history.flush()
+    # 在背景執行緒結束後，通知主執行緒更新 UI
+    gui_vars['on_stop']()
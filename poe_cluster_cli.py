@@ -0,0 +1,244 @@
+""" 不開 GUI 的命令列版本：直接讀 config.json 的座標、目標詞綴、K 值、延遲與流程執行洗石
+
+沒有 Tk 主迴圈，也沒有每 100ms 的滑鼠座標輪詢，適合長時間掛機或給基準測試呼叫。
+
+    python poe_cluster_cli.py
+    python poe_cluster_cli.py --backend dry_run --max-rolls 200 --log-format json
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+import cluster_core
+import roll_history
+from cluster_core import (
+    CONFIG_FILE, MOD_FILE, LOG_FILE, DELAY_AFTER_CLICK, DELAY_AFTER_COPY, DEFAULT_BACKEND, BACKENDS,
+    DEFAULT_MOD_FILTER_KEYWORDS, stop_event, read_config_file, load_mod_table, load_stat_index, TargetMatcher,
+    resolve_step_delays, create_backend, use_backend, release_shift_hold, worker_loop,
+)
+
+WORKFLOWS = ("single", "double", "shift")
+
+
+class ConfigError(Exception):
+    pass
+
+
+def read_config(path):
+    """ 只讀取，不像 load_config 會在檔案不存在時寫出預設值 """
+    try:
+        cfg = read_config_file(path)
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"載入設定檔錯誤: {e}")
+    if cfg is None:
+        raise ConfigError(f"找不到設定檔: {path} (請先用 GUI 儲存一次設定)")
+    return cfg
+
+
+def parse_pos(cfg, key, required=True):
+    value = cfg.get(key)
+    if isinstance(value, (list, tuple)) and len(value) == 2:
+        return (int(value[0]), int(value[1]))
+    if required:
+        raise ConfigError(f"設定檔缺少座標 {key}")
+    return None
+
+
+def resolve_targets(cfg, mods):
+    """ 把 selected_prefixes / selected_suffixes 的索引換成 worker 用的目標 (和 GUI 載入方式相同) """
+    targets = []
+    skipped = 0
+    for key in ("selected_prefixes", "selected_suffixes"):
+        for item in cfg.get(key, []):
+            idx = item.get("index")
+            if not (isinstance(idx, int) and 0 <= idx < len(mods)):
+                skipped += 1
+                continue
+            targets.append({
+                "mod": mods[idx],
+                "min": item.get("min"),
+                "max": item.get("max"),
+                "original_index": idx,
+            })
+    return targets, skipped
+
+
+def resolve_require_k(cfg, target_count):
+    if cfg.get("require_k_mode", "all") != "k_of_n":
+        return None
+    require_k = int(cfg.get("k_value", 1))
+    if require_k < 1 or require_k > target_count:
+        raise ConfigError(f"K 值不合法: {require_k} (目標數 {target_count})")
+    return require_k
+
+
+class ConsoleLog:
+    """ text: 一般文字；json: 每行一個 JSON 物件 (time, event, 其他欄位) """
+
+    def __init__(self, fmt="text", stream=None):
+        self.fmt = fmt
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def emit(self, event, message="", **fields):
+        now = datetime.now()
+        if self.fmt == "json":
+            record = {"time": now.isoformat(), "event": event}
+            if message:
+                record["message"] = message
+            record.update(fields)
+            line = json.dumps(record, ensure_ascii=False)
+        else:
+            extra = " ".join(f"{k}={v}" for k, v in fields.items())
+            line = f"[{now.strftime('%H:%M:%S')}] {message}{' ' + extra if extra else ''}"
+        with self._lock:
+            print(line, file=self.stream, flush=True)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="不開 GUI，依 config.json 執行自動洗星團")
+    parser.add_argument("--config", default=CONFIG_FILE, help="設定檔路徑 (預設: 程式旁的 config.json)")
+    parser.add_argument("--mod-file", default=MOD_FILE, help="stats.ndjson 路徑")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), help="覆寫設定檔的 backend")
+    parser.add_argument("--workflow", choices=WORKFLOWS, help="覆寫設定檔的 workflow")
+    parser.add_argument("--max-rolls", type=int, default=0, help="洗到這個次數就停止 (0 = 不限)")
+    parser.add_argument("--duration", type=float, default=0, help="執行幾秒後停止 (0 = 不限)")
+    parser.add_argument("--roll-log", default=LOG_FILE, help="每次洗石結果寫入的檔案")
+    parser.add_argument("--history", default=roll_history.HISTORY_FILE, help="結構化紀錄 (SQLite) 路徑")
+    parser.add_argument("--no-history", action="store_true", help="不寫入結構化紀錄")
+    parser.add_argument("--log-format", choices=("text", "json"), default="text", help="主控台輸出格式")
+    parser.add_argument("--no-esc", action="store_true", help="不註冊 ESC 緊急停止熱鍵")
+    return parser
+
+
+def register_esc(log):
+    try:
+        import keyboard
+        keyboard.add_hotkey("esc", lambda: (stop_event.set(), release_shift_hold()))
+        return True
+    except Exception as e:
+        log.emit("warning", f"無法註冊 ESC 熱鍵，請用 Ctrl+C 停止: {e}")
+        return False
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    log = ConsoleLog(args.log_format)
+
+    try:
+        cfg = read_config(args.config)
+        backend_name = args.backend or cfg.get("backend", DEFAULT_BACKEND)
+        workflow = args.workflow or cfg.get("workflow", "single")
+        if workflow not in WORKFLOWS:
+            raise ConfigError(f"未知的 workflow: {workflow}")
+        alt_pos = parse_pos(cfg, "alt_pos")
+        cluster_pos = parse_pos(cfg, "cluster_pos")
+        item2_pos = parse_pos(cfg, "item2_pos", required=workflow == "double")
+
+        mods = load_mod_table(
+            args.mod_file,
+            cfg.get("mod_filter_keywords", DEFAULT_MOD_FILTER_KEYWORDS),
+            cfg.get("mod_load_mode", "eager"),
+        )
+        targets, skipped = resolve_targets(cfg, mods)
+        if not targets:
+            raise ConfigError("設定檔沒有任何目標詞綴 (selected_prefixes / selected_suffixes)")
+        require_k = resolve_require_k(cfg, len(targets))
+        use_backend(create_backend(backend_name))
+    except (ConfigError, ValueError) as e:
+        log.emit("error", str(e))
+        return 2
+
+    if skipped:
+        log.emit("warning", f"略過 {skipped} 個超出詞綴表範圍的目標索引")
+    cluster_core.LOG_FILE = args.roll_log
+    log.emit(
+        "config", "設定",
+        backend=backend_name, workflow=workflow, targets=len(targets),
+        require_k=require_k if require_k is not None else "all",
+    )
+
+    history = None
+    session_id = None
+    if not args.no_history and cfg.get("roll_history", True):
+        try:
+            history = roll_history.RollHistory(args.history)
+            session_id = history.start_session(
+                workflow, backend_name, require_k, [t["mod"].ref for t in targets]
+            )
+        except sqlite3.Error as e:
+            history = None
+            log.emit("warning", f"無法開啟洗石紀錄資料庫: {e}")
+
+    finished = threading.Event()
+    summary = {"rolls": 0, "delays": None}
+
+    def set_count(count):
+        summary["rolls"] = count
+
+    def set_delays(delays):
+        summary["delays"] = delays
+
+    gui_vars = {
+        "alt_pos": alt_pos,
+        "cluster_pos": cluster_pos,
+        "item2_pos": item2_pos,
+        "workflow": workflow,
+        "targets": targets,
+        "require_k": require_k,
+        "matcher": TargetMatcher(targets, require_k),
+        "stat_index": load_stat_index(args.mod_file),
+        "loop_delay": float(cfg.get("loop_delay", 0.2)),
+        "append_log": lambda text: log.emit("log", text),
+        "set_count": set_count,
+        "max_rolls": args.max_rolls,
+        "offset": int(cfg.get("offset", 3)),
+        "click_delay": float(cfg.get("click_delay", DELAY_AFTER_CLICK)),
+        "copy_delay": float(cfg.get("copy_delay", DELAY_AFTER_COPY)),
+        "autotune": bool(cfg.get("autotune", False)),
+        "step_delays": resolve_step_delays(cfg.get("input_step_delays")),
+        "set_delays": set_delays,
+        "history": history,
+        "session_id": session_id,
+        "on_stop": finished.set,
+    }
+
+    if not args.no_esc and backend_name == DEFAULT_BACKEND:
+        register_esc(log)
+    if args.duration > 0:
+        timer = threading.Timer(args.duration, stop_event.set)
+        timer.daemon = True
+        timer.start()
+
+    start = time.perf_counter()
+    worker = threading.Thread(target=worker_loop, args=(gui_vars,), daemon=True)
+    worker.start()
+    try:
+        # 用逾時等待，主執行緒才收得到 Ctrl+C
+        while not finished.wait(0.2):
+            pass
+    except KeyboardInterrupt:
+        log.emit("log", "收到 Ctrl+C，停止中...")
+        stop_event.set()
+        release_shift_hold()
+        finished.wait()
+    worker.join()
+    elapsed = time.perf_counter() - start
+    if history is not None:
+        history.close()
+
+    fields = {"rolls": summary["rolls"], "seconds": round(elapsed, 3)}
+    if elapsed > 0:
+        fields["rolls_per_min"] = round(summary["rolls"] * 60 / elapsed, 1)
+    if summary["delays"]:
+        fields.update(summary["delays"])
+    log.emit("summary", "結束", **fields)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
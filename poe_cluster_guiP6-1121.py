@@ -1,346 +1,139 @@
-import json
-import threading
-import time
-import re
 import os
-import sys
-import random
+import queue
+import sqlite3
+import threading
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog  # 新增 filedialog
-import pyperclip
-import pydirectinput
 import pyautogui
 import keyboard
 
+import cluster_core
+import roll_history
+from cluster_core import (
+    BASE_DIR, MOD_FILE, LOG_FILE, DELAY_AFTER_CLICK, DELAY_AFTER_COPY, DEFAULT_BACKEND,
+    stop_event, load_config, save_config, load_mod_table, AffixSearchIndex, load_stat_index,
+    TargetMatcher, resolve_step_delays, create_backend, use_backend, release_shift_hold, worker_loop,
+    flush_roll_log,
+)
+
 
 # ---------- 設定 ----------
-# 判斷是否為打包後的環境 (Frozen/EXE)
-if getattr(sys, 'frozen', False):
-    BASE_DIR = os.path.dirname(sys.executable)
-else:
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
-MOD_FILE = os.path.join(BASE_DIR, "stats.ndjson")
-CONFIG_FILE = os.path.join(BASE_DIR, "config.json")
-LOG_FILE = os.path.join(BASE_DIR, "roll_log.txt")
-
-# 預設延遲 (秒)
-DELAY_AFTER_CLICK = 0.25
-DELAY_AFTER_COPY = 0.15
+# 搜尋框停止輸入多久後才重新篩選 (毫秒)
+SEARCH_DEBOUNCE_MS = 150
+# 背景執行緒送來的 log / 次數多久寫進畫面一次 (毫秒)
+UI_DRAIN_MS = 50
+# Log 視窗只保留最近幾行，完整紀錄在 roll_log.txt
+LOG_VIEW_LINES = 500
 # --------------------------
 
-stop_event = threading.Event()
-roll_count = 0
-
-# ---------- 檔案 / 模式處理 ----------
-def is_target_mod(mod, filter_config):
-    """ 使用設定檔中的關鍵字來判斷是否為目標詞綴 """
-    ref = mod.get("ref", "")
-    matchers = mod.get("matchers", [])
-    
-    ref_startswith_list = filter_config.get("ref_startswith", [])
-    for keyword in ref_startswith_list:
-        if ref.startswith(keyword):
-            return True
-            
-    string_contains_list = filter_config.get("string_contains", [])
-    for m in matchers:
-        s = m.get("string", "")
-        for keyword in string_contains_list:
-            if keyword in s:
-                return True
-
-    return False
-
-def load_mod_list(file_path, filter_config):
-    mods = []
-    # 如果路徑不存在，直接返回空陣列，讓 GUI 層處理
-    if not os.path.exists(file_path):
-        return mods
-
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    mod = json.loads(line)
-                    if is_target_mod(mod, filter_config):
-                        mods.append(mod)
-                except Exception:
-                    continue
-    except Exception as e:
-        print(f"讀取錯誤: {e}")
-        return []
-        
-    return mods
-
-
-def pattern_to_regex(pattern):
-    escaped = re.escape(pattern)
-    escaped = escaped.replace(r"\#", "#")
-    num_pat = r"([-+]?\d*\.?\d+)"  # 捕獲數字 (包含小數和正負號)
-    regex = escaped.replace("#", num_pat)
-    regex = regex.replace(r"\ ", r"\s*")
-    return re.compile(regex)
-
-
-def mod_match_line_with_value(line, compiled_pattern):
-    match = compiled_pattern.search(line)
-    if not match:
-        return None
-    
-    # 沒有捕獲組，代表是沒有 # 的詞綴，直接回傳 True 表示匹配成功
-    if not match.groups():
-        return True
 
-    try:
-        # 從第一個捕獲組中提取數值
-        value = float(match.group(1))
-        return value
-    except (IndexError, ValueError):
-        # 如果沒有捕獲組或轉換失敗，也當作是純文字匹配成功
+# ---------- GUI ----------
+class VirtualListbox(ttk.Frame):
+    """ 只繪製看得到的那幾行的 Listbox，資料量再大 載入/搜尋 的重繪成本都固定
+
+    row_text(pos) 由呼叫端提供，pos 是在目前清單中的位置；curselection() 也回傳這個位置。
+    """
+
+    def __init__(self, master, width=48, height=18):
+        super().__init__(master)
+        self._count = 0
+        self._row_text = lambda pos: ""
+        self._top = 0
+        self._visible = height
+        self._pixel_height = 0
+        self._selected = None
+
+        self.listbox = tk.Listbox(self, width=width, height=height, exportselection=False)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.listbox.bind("<<ListboxSelect>>", self._on_select)
+        self.listbox.bind("<Configure>", self._on_configure)
+        self.listbox.bind("<MouseWheel>", self._on_mousewheel)
+        self.listbox.bind("<Button-4>", lambda e: self._scroll_by(-3))
+        self.listbox.bind("<Button-5>", lambda e: self._scroll_by(3))
+
+    def set_rows(self, count, row_text):
+        self._count = count
+        self._row_text = row_text
+        self._top = 0
+        self._selected = None
+        self._render()
+
+    def curselection(self):
+        return () if self._selected is None else (self._selected,)
+
+    def yview(self, *args):
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._scroll_to(int(float(args[1]) * self._count))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= max(1, self._visible - 1)
+            self._scroll_by(step)
+
+    def _scroll_by(self, rows):
+        self._scroll_to(self._top + rows)
+        return "break"
+
+    def _scroll_to(self, top):
+        top = max(0, min(top, self._count - self._visible))
+        if top != self._top:
+            self._top = top
+            self._render()
+
+    def _on_mousewheel(self, event):
+        return self._scroll_by(-3 if event.delta > 0 else 3)
+
+    def _on_configure(self, event):
+        self._pixel_height = event.height
+        if self._update_visible():
+            self._render()
+
+    def _update_visible(self):
+        """ 依目前高度和行高重新計算可見行數，有變動時回傳 True """
+        bbox = self.listbox.bbox(0)  # 至少要有一行才量得到行高
+        if not bbox or not bbox[3] or not self._pixel_height:
+            return False
+        visible = max(1, self._pixel_height // bbox[3])
+        if visible == self._visible:
+            return False
+        self._visible = visible
+        self._top = max(0, min(self._top, self._count - self._visible))
         return True
 
-
-def extract_mod_section_from_clipboard(text):
-    if not text:
-        return []
-    sections = text.split("--------")
-    if len(sections) < 2:
-        return []
-    mod_section = sections[-2] if len(sections) >= 2 else text
-    lines = [ln.strip() for ln in mod_section.splitlines() if ln.strip()]
-    return lines
-
-
-def check_hit(mod_lines, target_mods, require_k=None):
-    if not target_mods:
-        return False, []
-
-    hit_details = []
-    
-    # 預先編譯所有目標詞綴的正規表示式
-    compiled_targets = []
-    for t in target_mods:
-        patterns = []
-        mod = t['mod']
-        for m in mod.get("matchers", []):
-            pat = m.get("string", "")
-            patterns.append(pattern_to_regex(pat))
-        compiled_targets.append({
-            "mod": mod,
-            "min": t.get("min"),
-            "max": t.get("max"),
-            "patterns": patterns
-        })
-
-    hit_count = 0
-    for target in compiled_targets:
-        target_matched = False
-        for p in target['patterns']:
-            for line in mod_lines:
-                # 使用新的匹配函式
-                match_result = mod_match_line_with_value(line, p)
-
-                if match_result is None:
-                    continue
-
-                # 提取數值和範圍
-                val = match_result if isinstance(match_result, float) else None
-                min_val = target.get("min")
-                max_val = target.get("max")
-                
-                # 檢查數值範圍
-                value_in_range = True
-                if val is not None:
-                    if min_val is not None and val < min_val:
-                        value_in_range = False
-                    if max_val is not None and val > max_val:
-                        value_in_range = False
-
-                if value_in_range:
-                    target_matched = True
-                    desc = target['mod'].get("matchers", [{}])[0].get("string", "??")
-                    hit_details.append(f"{desc} ({val})" if val is not None else desc)
-                    break # 找到符合的 line 就不用再找了
-            
-            if target_matched:
-                break # 找到符合的 pattern 就不用再找了
-        
-        if target_matched:
-            hit_count += 1
-            
-    # 判斷總命中結果
-    final_hit = False
-    if require_k is None:
-        final_hit = (hit_count == len(target_mods))
-    else:
-        final_hit = (hit_count >= require_k)
-
-    return final_hit, hit_details
-
-# ---------- IO: config / log ----------
-
-def save_config(cfg):
-    try:
-        # Preserve keywords if they exist in the current config on disk
-        current_config = load_config()
-        if current_config and 'mod_filter_keywords' in current_config:
-            cfg['mod_filter_keywords'] = current_config['mod_filter_keywords']
-
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(cfg, f, ensure_ascii=False, indent=2)
-        print(f"成功儲存設定到 {CONFIG_FILE}")
-    except Exception as e:
-        print(f"儲存設定失敗: {e}")
-
-
-def load_config():
-    default_filters = {
-        "mod_filter_keywords": {
-            "ref_startswith": [
-                "Added Small Passive Skills also grant",
-                "1 Added Passive Skill is",
-                "Added Small Passive Skills have"
-            ],
-            "string_contains": [
-                "附加的小天賦給予",
-                "附加的小型天賦給予",
-                "附加的小天賦增加",
-                "1 個附加天賦為"
-            ]
-        }
-    }
-    
-    if not os.path.exists(CONFIG_FILE):
-        # 如果設定檔不存在，建立一個包含預設篩選的
-        save_config(default_filters)
-        return default_filters
-
-    try:
-        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            cfg = json.load(f)
-            # 如果讀取的設定檔沒有篩選關鍵字，則補上
-            if 'mod_filter_keywords' not in cfg:
-                cfg.update(default_filters)
-                # 馬上存回去
-                save_config(cfg)
-            return cfg
-    except Exception as e:
-        print(f"載入設定檔錯誤: {e}")
-        return default_filters # 發生錯誤時返回預設值
-
-
-
-def append_log_line(line):
-    try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
-    except:
-        pass
-
-# ---------- 偏移與點擊 ----------
-
-def click_with_offset(x, y, offset=3, button="left"):
-    ox = x + random.randint(-offset, offset)
-    oy = y + random.randint(-offset, offset)
-    pydirectinput.moveTo(ox, oy)
-    time.sleep(0.01)
-    if button == "left":
-        pydirectinput.leftClick()
-    else:
-        pydirectinput.rightClick()
-
-
-def do_click_sequence(alt_pos, cluster_pos, offset, click_delay, copy_delay, workflow="single", item2_pos=None):
-    if workflow == 'double' and item2_pos is not None:
-        # 兩種通貨流程
-        # 1. 右鍵改造石 (通貨A)
-        click_with_offset(alt_pos[0], alt_pos[1], offset=offset, button="right")
-        time.sleep(0.06)
-        # 2. 左鍵星團
-        click_with_offset(cluster_pos[0], cluster_pos[1], offset=offset, button="left")
-        time.sleep(0.06) 
-        # 3. 右鍵通貨B
-        click_with_offset(item2_pos[0], item2_pos[1], offset=offset, button="right")
-        time.sleep(0.06)
-        # 4. 左鍵星團
-        click_with_offset(cluster_pos[0], cluster_pos[1], offset=offset, button="left")
-        time.sleep(click_delay)
-    else:
-        # 原本的單一通貨流程
-        # 右鍵改造石
-        click_with_offset(alt_pos[0], alt_pos[1], offset=offset, button="right")
-        time.sleep(0.06)
-        # 左鍵星團
-        click_with_offset(cluster_pos[0], cluster_pos[1], offset=offset, button="left")
-        time.sleep(click_delay)
-
-    # 共同的複製步驟
-    pydirectinput.keyDown("ctrl")
-    pydirectinput.press("c")
-    pydirectinput.keyUp("ctrl")
-    time.sleep(copy_delay)
-
-
-# ---------- 背景 worker ----------
-
-def worker_loop(gui_vars):
-    global roll_count
-    stop_event.clear()
-    roll_count = 0
-    start_time = datetime.now()
-    gui_vars['append_log']("開始自動洗石: " + start_time.strftime("%Y-%m-%d %H:%M:%S"))
-    while not stop_event.is_set():
-        do_click_sequence(
-            gui_vars['alt_pos'], 
-            gui_vars['cluster_pos'], 
-            gui_vars['offset'], 
-            gui_vars['click_delay'], 
-            gui_vars['copy_delay'],
-            workflow=gui_vars['workflow'],
-            item2_pos=gui_vars.get('item2_pos')
-        )
-        roll_count += 1
-        gui_vars['set_count'](roll_count)
-        clip = pyperclip.paste()
-        mod_lines = extract_mod_section_from_clipboard(clip)
-        
-        hit, hit_details = check_hit(mod_lines, gui_vars['targets'], require_k=gui_vars['require_k'])
-        
-        log_msg = f"[{roll_count}] 讀取 {len(mod_lines)} 行 -> {'HIT' if hit else 'MISS'}"
-        if hit:
-            log_msg += " | " + ", ".join(hit_details)
-            
-        gui_vars['append_log'](log_msg)
-        append_log_line(f"{datetime.now().isoformat()} | #{roll_count} | HIT={hit} | details={','.join(hit_details)} | lines={len(mod_lines)}")
-
-        if hit:
-            gui_vars['append_log']("命中條件，停止腳本。")
-            try:
-                pyautogui.alert('命中條件，停止腳本！') 
-            except Exception as e:
-                print(f"無法顯示 alert: {e}")
-            stop_event.set()
-        
-        time.sleep(gui_vars.get('loop_delay', 0.2))
-
-    end_time = datetime.now()
-    duration = end_time - start_time
-    gui_vars['append_log']("腳本結束: " + end_time.strftime("%Y-%m-%d %H:%M:%S"))
-    gui_vars['append_log'](f"總共洗了 {roll_count} 次，耗時: {duration}")
-    # 在背景執行緒結束後，通知主執行緒更新 UI
-    gui_vars['on_stop']()
+    def _on_select(self, event):
+        sel = self.listbox.curselection()
+        if sel:
+            self._selected = self._top + sel[0]
+
+    def _render(self):
+        end = min(self._count, self._top + self._visible + 1)
+        self.listbox.delete(0, tk.END)
+        for pos in range(self._top, end):
+            self.listbox.insert(tk.END, self._row_text(pos))
+        if self._update_visible():
+            return self._render()
+        if self._selected is not None and self._top <= self._selected < end:
+            self.listbox.selection_set(self._selected - self._top)
+        if self._count:
+            self.scrollbar.set(self._top / self._count, min(1.0, end / self._count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
 
 
-# ---------- GUI ----------
 class App:
     def __init__(self, root):
         self.root = root
         root.title("Cluster Washer (Press ESC to stop)")
+        # worker、熱鍵執行緒只把更新放進佇列，Tk 元件只在主執行緒的 _drain_ui_queue 裡修改
+        self.ui_queue = queue.SimpleQueue()
+        self._log_view_lines = 0  # log_text 目前的行數
+        self._last_mouse_pos = None
 
         # 1. 決定要讀取的檔案路徑 (預設為全域變數 MOD_FILE)
         self.current_mod_file = MOD_FILE
@@ -363,8 +156,20 @@ class App:
 
         # 3. 載入詞綴資料 (使用剛剛決定的路徑)
         self.loaded_config = load_config()
-        self.mods = load_mod_list(self.current_mod_file, self.loaded_config.get("mod_filter_keywords", {}))
+        # 輸入/剪貼簿後端: "real" 操作遊戲；"dry_run"、"recording" 不送出任何輸入
+        use_backend(create_backend(self.loaded_config.get("backend", DEFAULT_BACKEND)))
+        if cluster_core.backend.name != DEFAULT_BACKEND:
+            print(f"使用 {cluster_core.backend.name} 後端，不會送出任何輸入")
+        self.mods = load_mod_table(
+            self.current_mod_file,
+            self.loaded_config.get("mod_filter_keywords", {}),
+            self.loaded_config.get("mod_load_mode", "eager"),
+        )
         print(f"載入 {len(self.mods)} 個詞墜 (來源: {self.current_mod_file})")
+        # 完整詞綴索引 (用來在 log 記錄每一條洗出來的詞綴)，第一次 Start 時才建立
+        self.stat_index = None
+        # 結構化紀錄 (roll_history.sqlite3)，config.json 的 "roll_history": false 可關閉
+        self.history = None
 
         # ---- 座標設定（預設值）----
         self.alt_pos = (100, 200)
@@ -380,9 +185,10 @@ class App:
 
         # ---- 搜尋與篩選 ----
         self.search_var = tk.StringVar()
-        self.filtered_affixes = []
-        self.cluster_affixes = self.mods[:]
+        self.cluster_affixes = self.mods
         self.filtered_indices = list(range(len(self.mods)))
+        self.search_index = None  # 第一次搜尋時才建立
+        self._search_after_id = None
 
         # ---- 滑鼠座標追蹤 ----
         self.follow_mouse = tk.BooleanVar(value=False)
@@ -400,7 +206,7 @@ class App:
         self._registered_item2_hotkey = None
 
         # ---- 流程設定 ----
-        self.workflow_var = tk.StringVar(value="single") # 'single' or 'double'
+        self.workflow_var = tk.StringVar(value="single") # 'single', 'double' or 'shift'
         self.item2_pos = (100, 300)
         self.item2_pos_var = tk.StringVar(value=f"{self.item2_pos[0]},{self.item2_pos[1]}")
 
@@ -416,6 +222,7 @@ class App:
         self.loop_delay = tk.DoubleVar(value=0.2)
         self.click_delay = tk.DoubleVar(value=DELAY_AFTER_CLICK)
         self.copy_delay = tk.DoubleVar(value=DELAY_AFTER_COPY)
+        self.autotune = tk.BooleanVar(value=False)
 
         # ---- 偏移像素 ----
         self.offset = tk.IntVar(value=3)
@@ -432,6 +239,7 @@ class App:
 
         # ---- 開始更新滑鼠座標 ----
         self.update_mouse_pos()
+        self._drain_ui_queue()
 
         # 若載入失敗，顯示提示在 Log
         if not self.mods:
@@ -463,21 +271,40 @@ class App:
             stop_key = self.stop_hotkey_var.get()
 
             if alt_key:
-                self._registered_alt_hotkey = keyboard.add_hotkey(alt_key, self.record_alt_pos)
+                self._registered_alt_hotkey = keyboard.add_hotkey(alt_key, self._hotkey_record_pos(self.record_alt_pos))
             if cluster_key:
-                self._registered_cluster_hotkey = keyboard.add_hotkey(cluster_key, self.record_cluster_pos)
+                self._registered_cluster_hotkey = keyboard.add_hotkey(cluster_key, self._hotkey_record_pos(self.record_cluster_pos))
             if item2_key:
-                self._registered_item2_hotkey = keyboard.add_hotkey(item2_key, self.record_item2_pos)
+                self._registered_item2_hotkey = keyboard.add_hotkey(item2_key, self._hotkey_record_pos(self.record_item2_pos))
             if start_key:
-                self._registered_start_hotkey = keyboard.add_hotkey(start_key, self.start_roll)
+                self._registered_start_hotkey = keyboard.add_hotkey(start_key, self._hotkey_call(self.start_roll))
             if stop_key:
-                self._registered_stop_hotkey = keyboard.add_hotkey(stop_key, self.stop_roll)
+                self._registered_stop_hotkey = keyboard.add_hotkey(stop_key, self._hotkey_stop)
             
             self.append_log(f"快捷鍵已更新 (改造石: {alt_key}, 星團: {cluster_key}, 通貨B: {item2_key}, 開始: {start_key}, 停止: {stop_key})")
         except Exception as e:
             self.append_log(f"[錯誤] 無法設定快捷鍵: {e}")
             messagebox.showerror("快捷鍵錯誤", f"無法設定快捷鍵：{e}\n請確認按鍵名稱是否正確。")
 
+    # 熱鍵回呼在 keyboard 的執行緒上執行，不能直接碰 Tk 元件或跳出對話框，
+    # 一律排進 ui_queue 由主執行緒的 _drain_ui_queue 執行
+    def _hotkey_call(self, callback):
+        return lambda: self.ui_queue.put(("call", callback))
+
+    def _hotkey_record_pos(self, record):
+        def on_hotkey():
+            # 座標在按下熱鍵的當下讀取，畫面更新排回主執行緒；
+            # 一律讀真正的滑鼠 (dry_run / recording 後端的游標是假的)
+            pos = pyautogui.position()
+            self.ui_queue.put(("call", lambda: record(pos)))
+        return on_hotkey
+
+    def _hotkey_stop(self):
+        # 停止訊號立即送出 (不等下一次 _drain_ui_queue)，按鈕與 log 再排回主執行緒
+        stop_event.set()
+        release_shift_hold()
+        self.ui_queue.put(("call", self.stop_roll))
+
     def _on_tree_double_click(self, event, tree):
         region = tree.identify_region(event.x, event.y)
         if region != "cell":
@@ -560,23 +387,18 @@ class App:
         ttk.Label(affix_search_frame, text="搜尋詞綴：").pack(side="left")
         search_entry = ttk.Entry(affix_search_frame, textvariable=self.search_var)
         search_entry.pack(side="left", fill="x", expand=True)
-        self.search_var.trace_add("write", self.filter_affix_list)
+        self.search_var.trace_add("write", self._schedule_filter)
 
         # --- Listbox ---
         # 顯示當前讀取的檔名 (取 basename 避免太長)
         filename = os.path.basename(self.current_mod_file)
         ttk.Label(left, text=f"詞墜清單 ({filename})").pack(anchor="w")
         
-        self.mods_listbox = tk.Listbox(left, width=48, height=18)
-        self.mods_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar = ttk.Scrollbar(left, orient=tk.VERTICAL, command=self.mods_listbox.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.mods_listbox.config(yscrollcommand=scrollbar.set)
+        self.mods_listbox = VirtualListbox(left, width=48, height=18)
+        self.mods_listbox.pack(fill=tk.BOTH, expand=True)
 
-        # 初始載入資料
-        for i, m in enumerate(self.mods):
-            desc = m.get("matchers", [{}])[0].get("string", m.get("ref", f"mod{i}"))
-            self.mods_listbox.insert(tk.END, f"{i+1}. {desc}")
+        # 初始載入資料 (只會繪製看得到的行)
+        self.mods_listbox.set_rows(len(self.mods), lambda i: f"{i+1}. {self.mods.desc(i)}")
 
         mid = ttk.Frame(frm)
         mid.grid(row=0, column=1, sticky="n", padx=4)
@@ -684,6 +506,7 @@ class App:
         flow_frm.pack(fill=tk.X, pady=6)
         ttk.Radiobutton(flow_frm, text="單一通貨 (改造石)", variable=self.workflow_var, value="single").pack(anchor="w", padx=4)
         ttk.Radiobutton(flow_frm, text="兩種通貨 (改造石 -> 通貨B)", variable=self.workflow_var, value="double").pack(anchor="w", padx=4)
+        ttk.Radiobutton(flow_frm, text="持續套用 (按住 Shift，只點星團)", variable=self.workflow_var, value="shift").pack(anchor="w", padx=4)
 
         # ---- 通貨B座標設定 ----
         item2_pos_frm = ttk.LabelFrame(scrollable_frame, text="通貨B座標 (可選)")
@@ -721,8 +544,9 @@ class App:
 
         ttk.Label(offset_frm, text="點擊延遲 (秒)：").pack(anchor="w", pady=(4,0))
         ttk.Entry(offset_frm, textvariable=self.click_delay).pack(fill=tk.X, padx=4)
-        ttk.Label(offset_frm, text="Ctrl+C 延遲 (秒)：").pack(anchor="w", pady=(4,0))
+        ttk.Label(offset_frm, text="Ctrl+C 最長等待 (秒)：").pack(anchor="w", pady=(4,0))
         ttk.Entry(offset_frm, textvariable=self.copy_delay).pack(fill=tk.X, padx=4)
+        ttk.Checkbutton(offset_frm, text="自動調整延遲 (結束時套用收斂值)", variable=self.autotune).pack(anchor="w", padx=4, pady=(4,0))
 
         # ---- 控制按鈕 ----
         ctl_frm = ttk.Frame(frm)
@@ -741,28 +565,28 @@ class App:
         # ---- Log 區域 ----
         log_frame = ttk.Frame(frm)
         log_frame.grid(row=2, column=0, columnspan=3, sticky="we", pady=(6,0))
-        ttk.Label(log_frame, text="Log").pack(anchor="w")
+        ttk.Label(log_frame, text=f"Log (最近 {LOG_VIEW_LINES} 行)").pack(anchor="w")
         self.log_text = tk.Text(log_frame, height=10)
         self.log_text.pack(fill=tk.BOTH, expand=True)
 
+    def _schedule_filter(self, *args):
+        # 連續輸入時只在停下來後篩選一次
+        if self._search_after_id is not None:
+            self.root.after_cancel(self._search_after_id)
+        self._search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.filter_affix_list)
+
     def filter_affix_list(self, *args):
+        self._search_after_id = None
         keyword = self.search_var.get().strip().lower()
 
-        self.filtered_affixes = []
-        self.filtered_indices = []
-
-        for idx, affix in enumerate(self.cluster_affixes):
-            ref = affix.get("ref", "").lower()
-            matchers = [m.get("string","").lower() for m in affix.get("matchers",[])]
-            if not keyword or keyword in ref or any(keyword in m for m in matchers):
-                self.filtered_affixes.append(affix)
-                self.filtered_indices.append(idx)
+        if self.search_index is None:
+            self.search_index = AffixSearchIndex(self.cluster_affixes)
+        self.filtered_indices = self.search_index.search(keyword)
 
         # 重繪 Listbox
-        self.mods_listbox.delete(0, tk.END)
-        for affix in self.filtered_affixes:
-            desc = affix.get("matchers", [{}])[0].get("string", affix.get("ref",""))
-            self.mods_listbox.insert(tk.END, desc)
+        table = self.cluster_affixes
+        indices = self.filtered_indices
+        self.mods_listbox.set_rows(len(indices), lambda pos: table.desc(indices[pos]))
 
     def add_prefix(self):
         sel = self.mods_listbox.curselection()
@@ -771,9 +595,9 @@ class App:
 
         ui_idx = sel[0]
         real_idx = self.filtered_indices[ui_idx]
-        mod = self.mods[real_idx]
+        mod = self.mods[real_idx]  # mmap 模式下這時才解碼
 
-        desc = mod.get("matchers", [{}])[0].get("string", mod.get("ref", f"mod{ui_idx}"))
+        desc = self.mods.desc(real_idx)
         
         # 新增到 treeview
         self.prefix_tree.insert("", tk.END, values=(desc, "", ""))
@@ -788,9 +612,9 @@ class App:
 
         ui_idx = sel[0]
         real_idx = self.filtered_indices[ui_idx]
-        mod = self.mods[real_idx]
+        mod = self.mods[real_idx]  # mmap 模式下這時才解碼
 
-        desc = mod.get("matchers", [{}])[0].get("string", mod.get("ref", f"mod{ui_idx}"))
+        desc = self.mods.desc(real_idx)
         
         # 新增到 treeview
         self.suffix_tree.insert("", tk.END, values=(desc, "", ""))
@@ -807,20 +631,20 @@ class App:
             self.suffix_tree.delete(i)
         self.selected_suffix = []
 
-    def record_alt_pos(self):
-        x, y = pyautogui.position()
+    def record_alt_pos(self, pos):
+        x, y = pos
         self.alt_pos = (x, y)
         self.alteration_pos_var.set(f"{x},{y}")
         self.append_log(f"已設定改造石座標: {x},{y}")
 
-    def record_cluster_pos(self):
-        x, y = pyautogui.position()
+    def record_cluster_pos(self, pos):
+        x, y = pos
         self.cluster_pos = (x, y)
         self.cluster_pos_var.set(f"{x},{y}")
         self.append_log(f"已設定星團座標: {x},{y}")
 
-    def record_item2_pos(self):
-        x, y = pyautogui.position()
+    def record_item2_pos(self, pos):
+        x, y = pos
         self.item2_pos = (x, y)
         self.item2_pos_var.set(f"{x},{y}")
         self.append_log(f"已設定通貨B座標: {x},{y}")
@@ -828,30 +652,72 @@ class App:
     def update_mouse_pos(self):
         x, y = pyautogui.position()
         self.mouse_pos_label.config(text=f"鼠標: ({x},{y})")
-        if self.follow_mouse.get():
+        # 只在座標改變時記錄，和其他 log 一樣經過佇列與行數上限
+        if self.follow_mouse.get() and (x, y) != self._last_mouse_pos:
             self.append_log(f"[DEBUG] 鼠標即時座標: ({x},{y})")
+        self._last_mouse_pos = (x, y)
         self.root.after(100, self.update_mouse_pos)
 
     def append_log(self, text):
+        # 任何執行緒都可以呼叫；時間在呼叫當下記錄，實際寫入由 _drain_ui_queue 處理
         ts = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{ts}] {text}\n")
-        self.log_text.see(tk.END)
+        self.ui_queue.put(("log", f"[{ts}] {text}\n"))
 
     def set_count(self, n):
-        self.count_label.config(text=f"已洗次數: {n}")
+        self.ui_queue.put(("count", n))
+
+    def _drain_ui_queue(self):
+        """ 一次取出佇列中所有更新：log 合併成一次 insert，次數只顯示最新值 """
+        lines = []
+        count = None
+        calls = []
+        while True:
+            try:
+                kind, payload = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "log":
+                lines.append(payload)
+            elif kind == "count":
+                count = payload
+            else:
+                calls.append(payload)
+
+        if lines:
+            self._write_log_view(lines)
+        if count is not None:
+            self.count_label.config(text=f"已洗次數: {count}")
+        for call in calls:
+            call()
+        self.root.after(UI_DRAIN_MS, self._drain_ui_queue)
+
+    def _write_log_view(self, lines):
+        """ 加到 log_text 尾端，超過 LOG_VIEW_LINES 行就從頭刪掉最舊的 """
+        text = "".join(lines[-LOG_VIEW_LINES:])
+        self.log_text.insert(tk.END, text)
+        self._log_view_lines += text.count("\n")  # 訊息本身可能有換行
+        overflow = self._log_view_lines - LOG_VIEW_LINES
+        if overflow > 0:
+            self.log_text.delete("1.0", f"{overflow + 1}.0")
+            self._log_view_lines = LOG_VIEW_LINES
+        self.log_text.see(tk.END)
 
     def reload_mods(self):
         # 這裡改為使用 self.current_mod_file，這樣就能重新載入「當前選中的檔案」
         self.loaded_config = load_config()
-        self.mods = load_mod_list(self.current_mod_file, self.loaded_config.get("mod_filter_keywords", {}))
-        self.cluster_affixes = self.mods[:]
+        self.mods.close()
+        self.mods = load_mod_table(
+            self.current_mod_file,
+            self.loaded_config.get("mod_filter_keywords", {}),
+            self.loaded_config.get("mod_load_mode", "eager"),
+        )
+        self.cluster_affixes = self.mods
         self.filtered_indices = list(range(len(self.mods)))
+        self.search_index = None
+        self.stat_index = None
         
         print(f"重新載入 {len(self.mods)} 個詞墜，來源: {self.current_mod_file}")
-        self.mods_listbox.delete(0, tk.END)
-        for i, m in enumerate(self.mods):
-            desc = m.get("matchers", [{}])[0].get("string", m.get("ref", f"mod{i}"))
-            self.mods_listbox.insert(tk.END, f"{i+1}. {desc}")
+        self.mods_listbox.set_rows(len(self.mods), lambda i: f"{i+1}. {self.mods.desc(i)}")
         self.append_log(f"已重新載入詞檔 ({os.path.basename(self.current_mod_file)})")
 
     def _update_coords_from_vars(self):
@@ -901,6 +767,7 @@ class App:
             "offset": self.offset.get(),
             "click_delay": float(self.click_delay.get()),
             "copy_delay": float(self.copy_delay.get()),
+            "autotune": self.autotune.get(),
             "alt_hotkey": self.alt_hotkey_var.get(),
             "cluster_hotkey": self.cluster_hotkey_var.get(),
             "start_hotkey": self.start_hotkey_var.get(),
@@ -929,7 +796,7 @@ class App:
                 min_val = item.get("min")
                 max_val = item.get("max")
                 
-                desc = mod.get("matchers", [{}])[0].get("string", mod.get("ref", ""))
+                desc = self.mods.desc(idx)
                 min_str = str(min_val) if min_val is not None else ""
                 max_str = str(max_val) if max_val is not None else ""
                 
@@ -958,6 +825,7 @@ class App:
             self.offset.set(cfg.get("offset", 3))
             self.click_delay.set(cfg.get("click_delay", DELAY_AFTER_CLICK))
             self.copy_delay.set(cfg.get("copy_delay", DELAY_AFTER_COPY))
+            self.autotune.set(cfg.get("autotune", False))
             self.alt_hotkey_var.set(cfg.get("alt_hotkey", "f5"))
             self.cluster_hotkey_var.set(cfg.get("cluster_hotkey", "f6"))
             self.start_hotkey_var.set(cfg.get("start_hotkey", "f9"))
@@ -980,6 +848,7 @@ class App:
         self.append_log("已載入先前設定。")
 
     def open_log_file(self):
+        flush_roll_log()
         if os.path.exists(LOG_FILE):
             os.startfile(LOG_FILE)
         else:
@@ -988,7 +857,16 @@ class App:
     def on_worker_stop(self):
         # This function is called from the worker thread, so we need to
         # schedule the GUI update on the main thread.
-        self.root.after(0, self.update_ui_after_stop)
+        self.ui_queue.put(("call", self.update_ui_after_stop))
+
+    def on_delays_tuned(self, delays):
+        # 從 worker 執行緒呼叫，排回主執行緒更新輸入框
+        self.ui_queue.put(("call", lambda: self.apply_tuned_delays(delays)))
+
+    def apply_tuned_delays(self, delays):
+        self.click_delay.set(delays["click_delay"])
+        self.copy_delay.set(delays["copy_delay"])
+        self.loop_delay.set(delays["loop_delay"])
 
     def update_ui_after_stop(self):
         self.start_btn.config(state=tk.NORMAL)
@@ -1010,6 +888,10 @@ class App:
                 messagebox.showwarning("設定錯誤", "K 值不合法。")
                 return
 
+        if self.stat_index is None:
+            self.stat_index = load_stat_index(self.current_mod_file)
+        session_id = self._start_history_session(targets, require_k)
+
         gui_vars = {
             "alt_pos": self.alt_pos,
             "cluster_pos": self.cluster_pos,
@@ -1017,12 +899,19 @@ class App:
             "workflow": self.workflow_var.get(),
             "targets": targets,
             "require_k": require_k,
+            "matcher": TargetMatcher(targets, require_k),
+            "stat_index": self.stat_index,
             "loop_delay": float(self.loop_delay.get()),
             "append_log": self.append_log,
             "set_count": self.set_count,
             "offset": int(self.offset.get()),
             "click_delay": float(self.click_delay.get()),
             "copy_delay": float(self.copy_delay.get()),
+            "autotune": self.autotune.get(),
+            "step_delays": resolve_step_delays(self.loaded_config.get("input_step_delays")),
+            "set_delays": self.on_delays_tuned,
+            "history": self.history,
+            "session_id": session_id,
             "on_stop": self.on_worker_stop
         }
 
@@ -1032,22 +921,37 @@ class App:
         t = threading.Thread(target=worker_loop, args=(gui_vars,), daemon=True)
         t.start()
 
+    def _start_history_session(self, targets, require_k):
+        if not self.loaded_config.get("roll_history", True):
+            return None
+        try:
+            if self.history is None:
+                self.history = roll_history.RollHistory()
+            return self.history.start_session(
+                self.workflow_var.get(), cluster_core.backend.name, require_k,
+                [t["mod"].ref for t in targets],
+            )
+        except sqlite3.Error as e:
+            self.history = None
+            self.append_log(f"[警告] 無法開啟洗石紀錄資料庫，只寫入 roll_log.txt: {e}")
+            return None
+
     def stop_roll(self):
         stop_event.set()
+        release_shift_hold()
         self.stop_btn.config(state=tk.DISABLED) # Disable immediately for feedback
         self.append_log("停止訊號已發出。")
 
 
 def emergency_stop(event=None):
     stop_event.set()
+    release_shift_hold()
     print("緊急停止已觸發！")
 
 
-# 設定 Esc 為緊急停止
-keyboard.add_hotkey('esc', emergency_stop)
-
-
 def main():
+    # 設定 Esc 為緊急停止 (在 main 才註冊，其他工具匯入本模組時不會掛上全域熱鍵)
+    keyboard.add_hotkey('esc', emergency_stop)
     root = tk.Tk()
     app = App(root)
     root.mainloop()
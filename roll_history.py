@@ -0,0 +1,276 @@
+""" 洗石結果的結構化紀錄 (SQLite，WAL 模式，只會新增)
+
+roll_log.txt 是給人看的文字；這裡每一次洗石存成一列，每條詞綴 (含數值) 另存一列並建立索引，
+「洗多少次才出現某個詞綴」「某詞綴的數值分布」這類問題不用重新解析整個 log。
+
+    python roll_history.py sessions
+    python roll_history.py until "1 Added Passive Skill is Cremator"
+    python roll_history.py values "Added Small Passive Skills also grant: +# to Armour"
+"""
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from cluster_core import BASE_DIR
+
+HISTORY_FILE = os.path.join(BASE_DIR, "roll_history.sqlite3")
+# 背景寫入：累積幾筆或幾秒 commit 一次
+HISTORY_BATCH_ROLLS = 200
+HISTORY_FLUSH_INTERVAL = 1.0
+HISTORY_QUEUE_SIZE = 10000
+STAGES = ("input", "clipboard", "match", "identify")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id  INTEGER PRIMARY KEY,
+    started_at  REAL NOT NULL,
+    ended_at    REAL,
+    rolls       INTEGER,
+    workflow    TEXT,
+    backend     TEXT,
+    require_k   INTEGER,
+    targets     TEXT
+);
+CREATE TABLE IF NOT EXISTS stats (
+    stat_id     INTEGER PRIMARY KEY,
+    ref         TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS rolls (
+    session_id   INTEGER NOT NULL,
+    roll         INTEGER NOT NULL,
+    ts           REAL NOT NULL,
+    hit          INTEGER NOT NULL,
+    fresh        INTEGER NOT NULL,
+    mod_count    INTEGER NOT NULL,
+    input_ms     REAL,
+    clipboard_ms REAL,
+    match_ms     REAL,
+    identify_ms  REAL,
+    PRIMARY KEY (session_id, roll)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS roll_mods (
+    session_id  INTEGER NOT NULL,
+    roll        INTEGER NOT NULL,
+    position    INTEGER NOT NULL,
+    stat_id     INTEGER REFERENCES stats (stat_id),
+    value       REAL,
+    extra       TEXT,
+    raw         TEXT,
+    PRIMARY KEY (session_id, roll, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS roll_mods_by_stat ON roll_mods (stat_id, value);
+CREATE INDEX IF NOT EXISTS rolls_by_ts ON rolls (ts);
+CREATE INDEX IF NOT EXISTS rolls_by_hit ON rolls (hit, session_id);
+"""
+# roll_mods: stat_id 為 NULL 代表認不出來，這時才存原文 raw；value 是第一個數值，其餘放在 extra (逗號分隔)
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class RollHistory:
+    """ 在背景執行緒批次寫入 SQLite；record() 只把資料放進佇列 """
+
+    _STOP = object()
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        self._stat_ids = dict(self._conn.execute("SELECT ref, stat_id FROM stats"))
+        self._queue = queue.Queue(maxsize=HISTORY_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="roll-history-writer", daemon=True)
+        self._thread.start()
+
+    def start_session(self, workflow=None, backend=None, require_k=None, targets=()):
+        """ 立即寫入並回傳 session_id；targets 為 ref 的 list """
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO sessions (started_at, workflow, backend, require_k, targets) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), workflow, backend, require_k, json.dumps(list(targets), ensure_ascii=False)),
+            )
+            self._conn.commit()
+            return cur.lastrowid
+
+    def record(self, session_id, roll, ts, hit, fresh, identified, timings):
+        """ identified: identify_mod_lines 的結果；timings: 各階段秒數 """
+        self._queue.put(("roll", (session_id, roll, ts, hit, fresh, identified, timings)))
+
+    def end_session(self, session_id, rolls):
+        self._queue.put(("end", (session_id, rolls, time.time())))
+
+    def flush(self, timeout=5.0):
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        self._queue.put((self._STOP, None))
+        self._thread.join()
+        self._conn.close()
+
+    def _stat_id(self, ref):
+        stat_id = self._stat_ids.get(ref)
+        if stat_id is None:
+            self._conn.execute("INSERT OR IGNORE INTO stats (ref) VALUES (?)", (ref,))
+            stat_id = self._conn.execute("SELECT stat_id FROM stats WHERE ref = ?", (ref,)).fetchone()[0]
+            self._stat_ids[ref] = stat_id
+        return stat_id
+
+    def _write(self, items):
+        rolls = []
+        mods = []
+        with self._lock:
+            for kind, payload in items:
+                if kind == "end":
+                    session_id, count, ended_at = payload
+                    self._conn.execute(
+                        "UPDATE sessions SET ended_at = ?, rolls = ? WHERE session_id = ?",
+                        (ended_at, count, session_id),
+                    )
+                    continue
+                session_id, roll, ts, hit, fresh, identified, timings = payload
+                rolls.append((
+                    session_id, roll, ts, int(hit), int(fresh), len(identified),
+                    *(round(timings.get(stage, 0.0) * 1000, 3) for stage in STAGES),
+                ))
+                for position, (mod, values, line) in enumerate(identified):
+                    mods.append((
+                        session_id, roll, position,
+                        self._stat_id(mod.ref) if mod is not None else None,
+                        values[0] if values else None,
+                        ",".join(f"{v:g}" for v in values[1:]) or None,
+                        line if mod is None else None,
+                    ))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rolls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rolls
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO roll_mods VALUES (?, ?, ?, ?, ?, ?, ?)", mods
+            )
+            self._conn.commit()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, payload = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                kind, payload = None, None
+
+            if kind in ("roll", "end"):
+                batch.append((kind, payload))
+                if deadline is None:
+                    deadline = time.monotonic() + HISTORY_FLUSH_INTERVAL
+                if len(batch) < HISTORY_BATCH_ROLLS:
+                    continue
+            if batch:
+                try:
+                    self._write(batch)
+                except sqlite3.Error as e:
+                    print(f"寫入 {self.path} 失敗: {e}")
+                batch = []
+            deadline = None
+            if kind == "flush":
+                payload.set()
+            elif kind is self._STOP:
+                break
+
+
+# ---------- 查詢 ----------
+
+def list_sessions(conn):
+    return conn.execute(
+        "SELECT session_id, started_at, ended_at, rolls, workflow, backend, require_k, targets"
+        " FROM sessions ORDER BY session_id"
+    ).fetchall()
+
+
+def rolls_until(conn, ref, min_value=None):
+    """ 每個 session 第一次出現 ref (且數值 >= min_value) 是第幾次洗石；沒出現則為 None
+
+    stale (fresh = 0) 的洗石讀到的是上一次的剪貼簿，詞綴會重複計算，所以不列入。
+    """
+    sql = (
+        "SELECT s.session_id, s.rolls, (SELECT MIN(m.roll) FROM roll_mods m"
+        " JOIN rolls r ON r.session_id = m.session_id AND r.roll = m.roll AND r.fresh = 1"
+        " WHERE m.stat_id = (SELECT stat_id FROM stats WHERE ref = ?)"
+    )
+    params = [ref]
+    if min_value is not None:
+        sql += " AND m.value >= ?"
+        params.append(min_value)
+    sql += " AND m.session_id = s.session_id) FROM sessions s ORDER BY s.session_id"
+    return conn.execute(sql, params).fetchall()
+
+
+def value_distribution(conn, ref):
+    """ ref 出現過的 (數值, 次數)，數值由小到大；和 rolls_until 一樣不算 stale 的洗石 """
+    return conn.execute(
+        "SELECT m.value, COUNT(*) FROM roll_mods m"
+        " JOIN rolls r ON r.session_id = m.session_id AND r.roll = m.roll AND r.fresh = 1"
+        " WHERE m.stat_id = (SELECT stat_id FROM stats WHERE ref = ?)"
+        " GROUP BY m.value ORDER BY m.value",
+        (ref,),
+    ).fetchall()
+
+
+def _fmt_time(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else "-"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="查詢洗石結構化紀錄")
+    parser.add_argument("--db", default=HISTORY_FILE, help="roll_history.sqlite3 路徑")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("sessions", help="列出所有 session")
+    until = sub.add_parser("until", help="每個 session 洗到某詞綴需要的次數")
+    until.add_argument("ref")
+    until.add_argument("--min", type=float, dest="min_value")
+    values = sub.add_parser("values", help="某詞綴的數值分布")
+    values.add_argument("ref")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"找不到紀錄檔: {args.db}")
+        return 1
+    conn = sqlite3.connect(args.db)
+
+    if args.command == "sessions":
+        for sid, started, ended, rolls, workflow, backend, require_k, targets in list_sessions(conn):
+            print(f"#{sid} {_fmt_time(started)} ~ {_fmt_time(ended)} rolls={rolls} "
+                  f"workflow={workflow} backend={backend} k={require_k} targets={targets}")
+    elif args.command == "until":
+        found = []
+        for sid, rolls, first in rolls_until(conn, args.ref, args.min_value):
+            print(f"#{sid}: {first if first is not None else f'未出現 (共 {rolls} 次)'}")
+            if first is not None:
+                found.append(first)
+        if found:
+            print(f"平均 {sum(found) / len(found):.1f} 次 (出現於 {len(found)} 個 session)")
+    else:
+        rows = value_distribution(conn, args.ref)
+        total = sum(count for _, count in rows)
+        for value, count in rows:
+            label = f"{value:g}" if value is not None else "(無數值)"
+            print(f"{label:>8}  {count:>7}  {count / total:6.1%}")
+        print(f"共 {total} 筆")
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+import argparse
+import gzip
+import json
+import math
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# The GUI-free core module lives at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import cluster_core  # noqa: E402
+
+# === Settings ===
+# Paths are resolved relative to the repository root (two levels up).
+REPO_DIR = Path(__file__).resolve().parents[2]
+MOD_FILE = REPO_DIR / "stats.ndjson"
+LOG_FILE = REPO_DIR / "roll_log.txt"
+
+CHUNK_BYTES = 32 * 1024 * 1024   # plain-text logs are split into chunks this size for the pool
+Z = 1.96                         # 95% confidence intervals
+MAX_HISTOGRAM_BINS = 20          # more distinct values than this are grouped into bins
+TOP_MODS = 40                    # rows printed in the text report
+
+# Log line fields written by worker_loop:
+#   <iso time> | #<roll> | HIT=<bool> | details=... | lines=<n> [| stale=True] [| mods=a ; b ; ?raw]
+UNKNOWN = "?"
+
+_stat_index = None
+
+
+def _init_worker(mod_file):
+    global _stat_index
+    _stat_index = cluster_core.load_stat_index(mod_file) if mod_file else None
+
+
+def parse_target(text):
+    """'ref' or 'ref>=min' -> (ref, min or None)"""
+    if ">=" in text:
+        ref, low = text.rsplit(">=", 1)
+        return ref.strip(), float(low)
+    return text.strip(), None
+
+
+def parse_mod_entry(entry):
+    """'ref[1,2]' / 'ref' / '?raw line' -> (ref or None, values, raw)"""
+    if entry.startswith(UNKNOWN):
+        raw = entry[1:]
+        if _stat_index is not None:
+            # Re-identify with the current stats.ndjson (it may know lines the old run did not)
+            mod, values = _stat_index.identify(raw)
+            if mod is not None:
+                return mod.ref, values, raw
+        return None, [], raw
+    if entry.endswith("]") and "[" in entry:
+        ref, _, values = entry[:-1].rpartition("[")
+        try:
+            return ref, [float(v) for v in values.split(",") if v], None
+        except ValueError:
+            pass
+    return entry, [], None
+
+
+def open_log(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def iter_chunk_lines(path, start, end):
+    """Lines whose first byte lies in [start, end); end=None means to the end of the file."""
+    if path.endswith(".gz"):
+        with open_log(path) as f:
+            yield from f
+        return
+    with open(path, "rb") as f:
+        if start:
+            f.seek(start - 1)
+            f.readline()   # finish the line that started in the previous chunk
+        while end is None or f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line.decode("utf-8", errors="replace")
+
+
+def empty_result():
+    """Per-chunk aggregate with nothing counted yet; also the accumulator main() merges into."""
+    return {
+        "rolls": 0, "hits": 0, "stale": 0, "empty": 0, "no_mods": 0, "lines": 0,
+        "mods": Counter(), "values": {}, "unknown": Counter(), "reidentified": 0,
+        "target_counts": Counter(),
+    }
+
+
+def analyze_chunk(task):
+    """Aggregate one chunk; memory depends on distinct (mod, value) pairs, not on the log size."""
+    path, start, end, targets = task
+    result = empty_result()
+    for line in iter_chunk_lines(path, start, end):
+        fields = line.rstrip("\n").split(" | ")
+        if len(fields) < 5 or not fields[1].startswith("#"):
+            continue   # AUTOTUNE lines and anything else that is not a roll
+        result["lines"] += 1
+        extra = dict(f.split("=", 1) for f in fields[4:] if "=" in f)
+        if extra.get("stale") == "True":
+            result["stale"] += 1   # the clipboard held the previous roll; counting it would double it
+            continue
+        if extra.get("lines", "0") == "0":
+            result["empty"] += 1
+            continue
+        if "mods" not in extra:
+            result["no_mods"] += 1   # written before mods= existed; nothing to identify
+            continue
+
+        result["rolls"] += 1
+        if fields[2] == "HIT=True":
+            result["hits"] += 1
+        seen = {}
+        for entry in extra["mods"].split(" ; "):
+            entry = entry.strip()
+            if not entry:
+                continue
+            ref, values, raw = parse_mod_entry(entry)
+            if ref is None:
+                result["unknown"][raw] += 1
+                continue
+            if raw is not None:
+                result["reidentified"] += 1
+            if ref in seen:
+                continue
+            seen[ref] = values
+            result["mods"][ref] += 1
+            if values:
+                result["values"].setdefault(ref, Counter())[values[0]] += 1
+        if targets:
+            matched = 0
+            for ref, low in targets:
+                values = seen.get(ref)
+                if values is None:
+                    continue
+                if low is not None and (not values or values[0] < low):
+                    continue
+                matched += 1
+            result["target_counts"][matched] += 1
+    return result
+
+
+def merge(total, part):
+    for key in ("rolls", "hits", "stale", "empty", "no_mods", "lines", "reidentified"):
+        total[key] += part[key]
+    for key in ("mods", "unknown", "target_counts"):
+        total[key].update(part[key])
+    for ref, counter in part["values"].items():
+        total["values"].setdefault(ref, Counter()).update(counter)
+
+
+def make_tasks(paths, targets):
+    tasks = []
+    for path in paths:
+        if path.endswith(".gz"):
+            tasks.append((path, 0, None, targets))
+            continue
+        size = os.path.getsize(path)
+        start = 0
+        while True:
+            end = start + CHUNK_BYTES
+            tasks.append((path, start, end if end < size else None, targets))
+            if end >= size:
+                break
+            start = end
+    return tasks
+
+
+def default_paths():
+    """roll_log.txt plus its rotated segments (roll_log.<time>.txt[.gz])"""
+    root, ext = os.path.splitext(str(LOG_FILE))
+    folder = Path(root).parent
+    stem = Path(root).name
+    paths = sorted(str(p) for p in folder.glob(f"{stem}.*{ext}*"))
+    if LOG_FILE.exists():
+        paths.append(str(LOG_FILE))
+    return paths
+
+
+def wilson(successes, n, z=Z):
+    """Wilson score interval for a binomial proportion."""
+    if n == 0:
+        return 0.0, 0.0
+    p = successes / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def histogram(counter):
+    """Distinct values, or MAX_HISTOGRAM_BINS equal-width bins when there are more."""
+    values = sorted(counter)
+    if len(values) <= MAX_HISTOGRAM_BINS:
+        return [{"value": v, "count": counter[v]} for v in values]
+    low, high = values[0], values[-1]
+    width = (high - low) / MAX_HISTOGRAM_BINS
+    bins = [0] * MAX_HISTOGRAM_BINS
+    for value, count in counter.items():
+        bins[min(MAX_HISTOGRAM_BINS - 1, int((value - low) / width))] += count
+    return [
+        {"from": low + i * width, "to": low + (i + 1) * width, "count": count}
+        for i, count in enumerate(bins)
+    ]
+
+
+def build_report(total, targets):
+    rolls = total["rolls"]
+    mods = []
+    for ref, count in total["mods"].most_common():
+        low, high = wilson(count, rolls)
+        entry = {"ref": ref, "count": count, "rate": count / rolls, "ci_low": low, "ci_high": high}
+        if ref in total["values"]:
+            entry["values"] = histogram(total["values"][ref])
+        mods.append(entry)
+
+    report = {
+        "rolls": rolls,
+        "log_lines": total["lines"],
+        "skipped": {"stale": total["stale"], "empty": total["empty"], "no_mods": total["no_mods"]},
+        "hits": total["hits"],
+        "reidentified": total["reidentified"],
+        "unknown_lines": sum(total["unknown"].values()),
+        "unknown_top": total["unknown"].most_common(10),
+        "mods": mods,
+    }
+    if targets:
+        # P(at least k targets) for every k, and the expected rolls until that happens
+        odds = []
+        at_least = 0
+        for k in range(len(targets), 0, -1):
+            at_least += total["target_counts"][k]
+            low, high = wilson(at_least, rolls)
+            odds.append({
+                "k": k, "rolls": at_least, "rate": at_least / rolls if rolls else 0.0,
+                "ci_low": low, "ci_high": high,
+                "expected_rolls": rolls / at_least if at_least else None,
+                # fewest/most expected rolls from the interval ends
+                "expected_rolls_ci": [1 / high if high else None, 1 / low if low else None],
+            })
+        report["targets"] = [{"ref": ref, "min": low} for ref, low in targets]
+        report["k_odds"] = sorted(odds, key=lambda item: item["k"])
+    return report
+
+
+def print_report(report):
+    rolls = report["rolls"]
+    print(f"Rolls analysed: {rolls} (log lines {report['log_lines']}, skipped {report['skipped']})")
+    print(f"Hits: {report['hits']}, re-identified lines: {report['reidentified']}, "
+          f"unknown lines: {report['unknown_lines']}")
+    if not rolls:
+        return
+    print()
+    print(f"{'rate':>8} {'95% CI':>17} {'count':>8}  mod")
+    for entry in report["mods"][:TOP_MODS]:
+        ci = f"{entry['ci_low']:.3%}-{entry['ci_high']:.3%}"
+        line = f"{entry['rate']:>8.3%} {ci:>17} {entry['count']:>8}  {entry['ref']}"
+        values = entry.get("values")
+        if values and "value" in values[0]:
+            line += "  [" + " ".join(f"{v['value']:g}:{v['count']}" for v in values) + "]"
+        elif values:
+            line += f"  [{values[0]['from']:g}..{values[-1]['to']:g} in {len(values)} bins]"
+        print(line)
+    if len(report["mods"]) > TOP_MODS:
+        print(f"... {len(report['mods']) - TOP_MODS} more (use --json for all)")
+    if "k_odds" in report:
+        print()
+        print("Target set: " + ", ".join(
+            t["ref"] + (f" >= {t['min']:g}" if t["min"] is not None else "") for t in report["targets"]))
+        for item in report["k_odds"]:
+            expected = f"{item['expected_rolls']:.1f}" if item["expected_rolls"] else "-"
+            lo, hi = item["expected_rolls_ci"]
+            ci = f"{lo:.1f}-{hi:.1f}" if lo and hi else "-"
+            print(f"  at least {item['k']}: {item['rate']:.4%} "
+                  f"(CI {item['ci_low']:.4%}-{item['ci_high']:.4%}) expected rolls {expected} (CI {ci})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-mod statistics from roll_log.txt and its rotated segments")
+    parser.add_argument("paths", nargs="*", help="log files (.txt or .gz); default: roll_log.txt and its segments")
+    parser.add_argument("--mod-file", default=str(MOD_FILE), help="stats.ndjson used to re-identify unknown lines")
+    parser.add_argument("--no-reidentify", action="store_true", help="keep unknown lines as they were logged")
+    parser.add_argument("--target", action="append", default=[], help="target ref, optionally 'ref>=min'; repeatable")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="process pool size (1 = no pool)")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args()
+
+    paths = args.paths or default_paths()
+    missing = [p for p in paths if not os.path.exists(p)]
+    if not paths or missing:
+        print(f"Log file not found: {', '.join(missing) or LOG_FILE}")
+        return
+    mod_file = None if args.no_reidentify or not os.path.exists(args.mod_file) else args.mod_file
+    targets = [parse_target(t) for t in args.target]
+
+    tasks = make_tasks(paths, targets)
+    total = empty_result()
+    if args.workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(mod_file,)) as pool:
+            for part in pool.map(analyze_chunk, tasks):
+                merge(total, part)
+    else:
+        _init_worker(mod_file)
+        for task in tasks:
+            merge(total, analyze_chunk(task))
+
+    report = build_report(total, targets)
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# The GUI-free core module lives at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import cluster_core  # noqa: E402
+
+# === Settings ===
+# Paths are resolved relative to the repository root (two levels up).
+REPO_DIR = Path(__file__).resolve().parents[2]
+MOD_FILE = REPO_DIR / "stats.ndjson"
+CONFIG_FILE = REPO_DIR / "config.json"
+
+OUTPUT_FILE = "bench_results.json"   # machine-readable results (written to the cwd)
+BASELINE_FILE = None                 # e.g. "bench_results.base.json" to compare against
+REGRESSION_THRESHOLD = 1.20          # flag results slower than baseline by this factor
+
+SEED = 1121
+REPEAT = 5                           # each benchmark is timed this many times; best is reported
+CORPUS_SIZE = 5000                   # synthetic clipboard texts
+CLUSTER_LINE_RATE = 0.8              # share of mod lines taken from the cluster pool
+MOD_LINES = (1, 4)                   # mod lines per item
+NOISE_LINES = (0, 2)                 # unrelated lines mixed into the mod section
+NON_ITEM_RATE = 0.02                 # clipboard texts that are not items at all
+VALUE_RANGE = (1, 120)
+TARGET_COUNTS = (1, 2, 5, 10, 20)
+SEARCH_QUERIES = 200
+
+NOISE = [
+    "已汙染",
+    "無法修改",
+    "附加的小天賦給予：12% 火焰傷害增加 (enchant)",
+    "Note: ~price 1 chaos",
+    "鏡像",
+]
+
+
+def load_filter_keywords():
+    config = cluster_core.read_config_file(str(CONFIG_FILE)) or {}
+    return config.get("mod_filter_keywords", cluster_core.DEFAULT_MOD_FILTER_KEYWORDS)
+
+
+def load_records():
+    records = []
+    with MOD_FILE.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def fill_values(pattern, rng):
+    text = pattern
+    while "#" in text:
+        value = rng.randint(*VALUE_RANGE)
+        if rng.random() < 0.1:
+            value = f"{value}.{rng.randint(0, 9)}"
+        text = text.replace("#", str(value), 1)
+    return text.strip()
+
+
+def make_corpus(cluster_pool, all_strings, rng):
+    """Synthetic Ctrl+C texts shaped like the game's (sections split by --------)."""
+    corpus = []
+    for _ in range(CORPUS_SIZE):
+        if rng.random() < NON_ITEM_RATE:
+            corpus.append(rng.choice(["", "copied chat message", fill_values(rng.choice(all_strings), rng)]))
+            continue
+        lines = []
+        for _ in range(rng.randint(*MOD_LINES)):
+            if rng.random() < CLUSTER_LINE_RATE:
+                pattern = rng.choice(rng.choice(cluster_pool).strings)
+            else:
+                pattern = rng.choice(all_strings)
+            lines.append(fill_values(pattern, rng))
+        for _ in range(rng.randint(*NOISE_LINES)):
+            lines.insert(rng.randint(0, len(lines)), rng.choice(NOISE))
+        corpus.append("\n--------\n".join([
+            "物品種類: 珠寶\n稀有度: 魔法\n大型星團珠寶",
+            "需求:\n等級: 54",
+            f"物品等級: {rng.randint(1, 86)}",
+            "附加 8 個天賦 (enchant)",
+            "\n".join(lines),
+            "放置於天賦樹上已配置的大型珠寶插槽。",
+        ]) + "\n")
+    return corpus
+
+
+def make_targets(cluster_pool, count, rng):
+    targets = []
+    for mod in rng.sample(cluster_pool, count):
+        target = {"mod": mod, "min": None, "max": None}
+        if "#" in mod.desc and rng.random() < 0.5:
+            target["min"] = rng.randint(*VALUE_RANGE)
+        targets.append(target)
+    return targets
+
+
+def make_queries(cluster_pool, rng):
+    queries = ["", "傷害", "1 個附加", "added small", "zzz"]
+    while len(queries) < SEARCH_QUERIES:
+        text = rng.choice(cluster_pool).desc
+        start = rng.randrange(len(text))
+        queries.append(text[start:start + rng.randint(1, 4)].strip().lower())
+    return queries
+
+
+def measure(name, func, ops, **params):
+    """Time func() REPEAT times; func runs `ops` operations per call."""
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        "name": name,
+        "params": params,
+        "ops": ops,
+        "repeat": REPEAT,
+        "best_s": best,
+        "median_s": statistics.median(timings),
+        "ns_per_op": best / ops * 1e9 if ops else None,
+    }
+
+
+def result_key(result):
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare_with_baseline(results):
+    baseline_path = Path(BASELINE_FILE)
+    if not baseline_path.exists():
+        print(f"Baseline file not found: {baseline_path}")
+        return
+    with baseline_path.open("r", encoding="utf-8") as f:
+        baseline = {result_key(r): r for r in json.load(f)["results"]}
+    regressions = 0
+    for result in results:
+        base = baseline.get(result_key(result))
+        if base is None or not base["best_s"]:
+            continue
+        ratio = result["best_s"] / base["best_s"]
+        result["baseline_ratio"] = ratio
+        if ratio > REGRESSION_THRESHOLD:
+            regressions += 1
+            print(f"REGRESSION {result['name']} {result['params']}: {ratio:.2f}x slower")
+    print(f"Compared with {baseline_path}: {regressions} regression(s)")
+
+
+def main():
+    if not MOD_FILE.exists():
+        print(f"Input file not found: {MOD_FILE}")
+        return
+
+    rng = random.Random(SEED)
+    filter_config = load_filter_keywords()
+    records = load_records()
+    cluster_pool = cluster_core.load_mod_list(str(MOD_FILE), filter_config, use_cache=False)
+    all_strings = [m.get("string", "") for r in records for m in r.get("matchers", []) if m.get("string")]
+    corpus = make_corpus(cluster_pool, all_strings, rng)
+    sections = [cluster_core.extract_mod_section_from_clipboard(text) for text in corpus]
+    print(f"{len(records)} stats, {len(cluster_pool)} cluster mods, {len(corpus)} clipboard texts")
+
+    results = []
+    file_path = str(MOD_FILE)
+    results.append(measure(
+        "load_mod_list", lambda: cluster_core.load_mod_list(file_path, filter_config, use_cache=False), 1, cache=False
+    ))
+    cluster_core.load_mod_list(file_path, filter_config)  # make sure the cache exists
+    results.append(measure(
+        "load_mod_list", lambda: cluster_core.load_mod_list(file_path, filter_config), 1, cache=True
+    ))
+    results.append(measure(
+        "is_target_mod", lambda: [cluster_core.is_target_mod(r, filter_config) for r in records], len(records)
+    ))
+    results.append(measure(
+        "extract_mod_section_from_clipboard",
+        lambda: [cluster_core.extract_mod_section_from_clipboard(text) for text in corpus],
+        len(corpus),
+    ))
+
+    for count in TARGET_COUNTS:
+        if count > len(cluster_pool):
+            continue
+        targets = make_targets(cluster_pool, count, rng)
+        for mode, require_k in (("all", None), ("k_of_n", max(1, count // 2))):
+            params = {"targets": count, "mode": mode, "k": require_k}
+            # check_hit compiles the targets on every call, as external callers use it
+            results.append(measure(
+                "check_hit",
+                lambda: [cluster_core.check_hit(lines, targets, require_k) for lines in sections],
+                len(sections), **params
+            ))
+            # worker_loop builds the matcher once per session and calls it every roll
+            matcher = cluster_core.TargetMatcher(targets, require_k)
+            results.append(measure(
+                "target_matcher", lambda: [matcher(lines) for lines in sections], len(sections), **params
+            ))
+
+    # filter_affix_list is a Tk method; its work is building the index once and searching
+    table = cluster_core.load_mod_table(file_path, filter_config)
+    queries = make_queries(cluster_pool, rng)
+    results.append(measure("filter_affix_list.index", lambda: cluster_core.AffixSearchIndex(table), 1))
+    index = cluster_core.AffixSearchIndex(table)
+    results.append(measure(
+        "filter_affix_list.search", lambda: [index.search(q) for q in queries], len(queries)
+    ))
+
+    for result in results:
+        params = " ".join(f"{k}={v}" for k, v in result["params"].items())
+        print(f"{result['name']:<36} {params:<28} {result['ns_per_op'] / 1000:>12.2f} us/op")
+
+    if BASELINE_FILE:
+        compare_with_baseline(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "seed": SEED,
+            "corpus_size": len(corpus),
+            "cluster_mods": len(cluster_pool),
+        },
+        "results": results,
+    }
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results: {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import ast
+import importlib.util
+import json
+import random
+import time
+import tracemalloc
+import types
+from datetime import datetime
+from pathlib import Path
+
+# === Settings ===
+# Paths are resolved relative to the repository root (two levels up).
+REPO_DIR = Path(__file__).resolve().parents[2]
+MOD_FILE = REPO_DIR / "stats.ndjson"
+BENCH_SCRIPT = REPO_DIR / "tool" / "bench_hotpaths" / "bench_hotpaths.py"  # corpus generator
+
+OUTPUT_FILE = "compare_results.json"   # machine-readable results (written to the cwd)
+
+# name -> (script, uses filter config, value ranges)
+#   filter config: is_target_mod(record, cfg) / load_mod_list(path, cfg) returning Mod objects,
+#                  otherwise is_cluster_mod(record) / load_mod_list(path) returning dicts
+#   value ranges:  check_hit(lines, [{"mod", "min", "max"}]) -> (bool, details),
+#                  otherwise check_hit(lines, [mod dict]) -> bool
+VERSIONS = {
+    "P3": ("poe_cluster_guiP3.py", False, False),
+    "P4": ("poe_cluster_guiP4.py", False, False),
+    "P5-1119": ("poe_cluster_guiP5-1119.py", False, True),
+    # P6-1121 keeps its matching/loading code in the GUI-free core module
+    "P6-1121": ("cluster_core.py", True, True),
+}
+REFERENCE = "P6-1121"                  # agreement is measured against this version
+
+# Modules that open windows, hook the keyboard or touch the mouse; never imported
+GUI_MODULES = {"tkinter", "pyperclip", "pydirectinput", "pyautogui", "keyboard"}
+
+SEED = 1121
+REPEAT = 3
+TARGET_SETS = ((1, None), (3, None), (3, 1), (5, 2))   # (target count, require_k)
+RANGED_RATE = 0.5                      # targets with a value that also get a minimum
+SEEDED_RATE = 0.2                      # items that get extra lines rendered from the targets
+MAX_DISAGREEMENT_SAMPLES = 5
+
+
+def load_headless(script):
+    """Execute a GUI script without its side effects.
+
+    Only top-level imports (minus GUI_MODULES), plain assignments, functions,
+    non-Tk classes and if-blocks other than the __main__ guard are kept, so
+    Tk is never created and keyboard.add_hotkey(...) is never called.
+    """
+    path = REPO_DIR / script
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    kept = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            node.names = [a for a in node.names if a.name.split(".")[0] not in GUI_MODULES]
+            if node.names:
+                kept.append(node)
+        elif isinstance(node, ast.ImportFrom):
+            if (node.module or "").split(".")[0] not in GUI_MODULES:
+                kept.append(node)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            kept.append(node)
+        elif isinstance(node, ast.ClassDef):
+            bases = {ast.unparse(b).split(".")[0] for b in node.bases}
+            if node.name != "App" and not bases & {"tk", "ttk"}:
+                kept.append(node)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if all(isinstance(t, (ast.Name, ast.Tuple)) for t in targets):
+                kept.append(node)
+        elif isinstance(node, ast.If) and "__name__" not in ast.unparse(node.test):
+            kept.append(node)
+    tree.body = kept
+
+    module = types.ModuleType(path.stem.replace("-", "_"))
+    module.__file__ = str(path)
+    exec(compile(tree, str(path), "exec"), module.__dict__)
+    return module
+
+
+class Version:
+    """Adapts one generation's functions to a common (ref-based) interface."""
+
+    def __init__(self, name, script, uses_filter_config, supports_ranges):
+        self.name = name
+        self.module = load_headless(script)
+        self.uses_filter_config = uses_filter_config
+        self.supports_ranges = supports_ranges
+        self.mods = []
+        self.by_ref = {}
+
+    def filter(self, record, filter_config):
+        if self.uses_filter_config:
+            return self.module.is_target_mod(record, filter_config)
+        return self.module.is_cluster_mod(record)
+
+    def load(self, filter_config):
+        if self.uses_filter_config:
+            return self.module.load_mod_list(str(MOD_FILE), filter_config, use_cache=False)
+        return self.module.load_mod_list(str(MOD_FILE))
+
+    def ref(self, mod):
+        return mod.ref if self.uses_filter_config else mod.get("ref", "")
+
+    def set_mods(self, mods):
+        self.mods = mods
+        self.by_ref = {}
+        for mod in mods:
+            self.by_ref.setdefault(self.ref(mod), mod)
+
+    def build_targets(self, targets):
+        """targets: [(ref, min, max)] in this version's own format"""
+        if not self.supports_ranges:
+            return [self.by_ref[ref] for ref, _, _ in targets]
+        return [{"mod": self.by_ref[ref], "min": lo, "max": hi} for ref, lo, hi in targets]
+
+    def check(self, mod_lines, targets, require_k):
+        result = self.module.check_hit(mod_lines, targets, require_k)
+        return result if isinstance(result, bool) else result[0]
+
+
+def load_bench_helpers():
+    spec = importlib.util.spec_from_file_location("bench_hotpaths", BENCH_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(func):
+    """Best wall time of REPEAT runs, then peak traced memory of one more run."""
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def agreement(results, reference):
+    """Per-version share of answers equal to the reference, plus sample indices that differ."""
+    summary = {}
+    for name, answers in results.items():
+        differ = [i for i, (a, b) in enumerate(zip(answers, reference)) if a != b]
+        summary[name] = {
+            "agree": 1 - len(differ) / len(reference) if reference else 1.0,
+            "differ": len(differ),
+            "samples": differ[:MAX_DISAGREEMENT_SAMPLES],
+        }
+    return summary
+
+
+def main():
+    if not MOD_FILE.exists():
+        print(f"Input file not found: {MOD_FILE}")
+        return
+
+    versions = {name: Version(name, *spec) for name, spec in VERSIONS.items()}
+    reference = versions[REFERENCE]
+    filter_config = reference.module.DEFAULT_MOD_FILTER_KEYWORDS
+    bench = load_bench_helpers()
+    rng = random.Random(SEED)
+    records = bench.load_records()
+    report = {"meta": {"timestamp": datetime.now().isoformat(), "seed": SEED}, "results": []}
+
+    def add(name, stage, params, seconds, peak, ops, extra=None):
+        row = {
+            "version": name, "stage": stage, "params": params, "ops": ops,
+            "best_s": seconds, "ops_per_s": ops / seconds if seconds else None,
+            "peak_bytes": peak,
+        }
+        row.update(extra or {})
+        report["results"].append(row)
+        print(f"{name:<8} {stage:<10} {json.dumps(params):<36} "
+              f"{row['ops_per_s'] or 0:>12.0f} ops/s {peak / 1024:>10.1f} KiB")
+
+    # 1. Filtering raw stats records
+    answers = {}
+    for name, version in versions.items():
+        answers[name], seconds, peak = timed(lambda: [version.filter(r, filter_config) for r in records])
+        add(name, "filter", {}, seconds, peak, len(records))
+    report["agreement_filter"] = agreement(answers, answers[REFERENCE])
+
+    # 2. Loading the mod list
+    refs = {}
+    for name, version in versions.items():
+        mods, seconds, peak = timed(lambda: version.load(filter_config))
+        version.set_mods(mods)
+        refs[name] = sorted(version.by_ref)
+        add(name, "load", {}, seconds, peak, 1, {"mods": len(mods)})
+    common_refs = sorted(set.intersection(*(set(r) for r in refs.values())))
+
+    # 3. check_hit on a shared corpus, with and without value ranges
+    cluster_pool = reference.mods
+    all_strings = [m.get("string", "") for r in records for m in r.get("matchers", []) if m.get("string")]
+    corpus = bench.make_corpus(cluster_pool, all_strings, rng)
+    sections = [reference.module.extract_mod_section_from_clipboard(text) for text in corpus]
+    desc_by_ref = {mod.ref: mod.desc for mod in cluster_pool}
+    matchable_refs = [ref for ref in common_refs if ref in desc_by_ref]
+    report["agreement_check_hit"] = []
+    for ranged in (False, True):
+        for count, require_k in TARGET_SETS:
+            targets = []
+            for ref in rng.sample(matchable_refs, count):
+                lo = None
+                if ranged and "#" in desc_by_ref.get(ref, "") and rng.random() < RANGED_RATE:
+                    lo = rng.randint(*bench.VALUE_RANGE)
+                targets.append((ref, lo, None))
+            params = {"targets": count, "k": require_k, "ranged": ranged}
+            # Without seeding, "all of N" almost never hits and agreement would be trivial
+            seeded = []
+            for lines in sections:
+                if rng.random() < SEEDED_RATE:
+                    extra = [bench.fill_values(desc_by_ref[ref], rng) for ref, _, _ in targets]
+                    lines = lines + rng.sample(extra, rng.randint(1, len(extra)))
+                seeded.append(lines)
+            answers = {}
+            for name, version in versions.items():
+                if ranged and not version.supports_ranges:
+                    continue
+                built = version.build_targets(targets)
+                answers[name], seconds, peak = timed(
+                    lambda: [version.check(lines, built, require_k) for lines in seeded]
+                )
+                add(name, "check_hit", params, seconds, peak, len(seeded),
+                    {"hits": sum(answers[name])})
+                matcher_class = getattr(version.module, "TargetMatcher", None)
+                if matcher_class is not None:
+                    # Newer versions compile the targets once per session for worker_loop
+                    matcher = matcher_class(built, require_k)
+                    _, seconds, peak = timed(lambda: [matcher(lines)[0] for lines in seeded])
+                    add(name, "matcher", params, seconds, peak, len(seeded))
+            report["agreement_check_hit"].append(
+                {"params": params, "targets": [t[0] for t in targets],
+                 "versions": agreement(answers, answers[REFERENCE])}
+            )
+
+    print()
+    print("Loaded mods: " + ", ".join(f"{n}={len(r)}" for n, r in refs.items())
+          + f" (common {len(common_refs)})")
+    for name, item in report["agreement_filter"].items():
+        print(f"filter agreement {name:<8} {item['agree']:.4f} ({item['differ']} differ)")
+    for entry in report["agreement_check_hit"]:
+        worst = min(entry["versions"].items(), key=lambda kv: kv[1]["agree"])
+        print(f"check_hit {json.dumps(entry['params']):<44} lowest agreement "
+              f"{worst[0]}={worst[1]['agree']:.4f}")
+
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results: {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
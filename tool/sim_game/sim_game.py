@@ -0,0 +1,363 @@
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# The GUI-free core module lives at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import cluster_core  # noqa: E402
+
+# === Settings ===
+# Paths are resolved relative to the repository root (two levels up).
+REPO_DIR = Path(__file__).resolve().parents[2]
+MOD_FILE = REPO_DIR / "stats.ndjson"
+CONFIG_FILE = REPO_DIR / "config.json"
+
+SEED = 1121
+WORKFLOW = "single"               # "single", "double" or "shift"
+ALT_POS = (1000, 500)             # where the alteration orb sits
+ITEM2_POS = (1050, 500)           # second currency (augmentation) for "double"
+CLUSTER_POS = (1100, 500)         # where the cluster jewel sits
+OFFSET = 3
+
+# Simulated game behaviour
+COPY_LATENCY = 0.03               # seconds between Ctrl+C and the clipboard update
+COPY_JITTER = 0.01                # extra random latency, uniform in [0, COPY_JITTER]
+MODS_PER_JEWEL = (1, 2)           # magic cluster jewels roll one or two mods
+VALUE_RANGE = (1, 40)             # random values written into each "#"
+
+# Worker settings (seconds); copy_delay is the clipboard wait ceiling
+CLICK_DELAY = 0.0
+COPY_DELAY = 0.25
+LOOP_DELAY = 0.0
+STEP_DELAYS = {"move_settle": 0.0, "after_currency": 0.005, "key_gap": 0.002}
+
+# Benchmark phases
+TARGET_COUNT = 5                  # random targets picked from the pool
+REQUIRE_K = 1                     # None = all targets must hit
+HIT_TRIALS = 20                   # worker runs that each end on a hit
+TRIAL_TIMEOUT = 30.0              # give up on a trial after this many seconds
+STOP_TRIALS = 20                  # worker runs stopped from outside
+STOP_AFTER = (0.1, 0.4)           # stop_event is set after a random delay in this range
+
+
+def load_filter_keywords():
+    config = cluster_core.read_config_file(str(CONFIG_FILE)) or {}
+    return config.get("mod_filter_keywords", cluster_core.DEFAULT_MOD_FILTER_KEYWORDS)
+
+
+class SimulatedGame:
+    """Plays the game's side of the input/clipboard backend interface.
+
+    Right-clicking a currency picks it up, left-clicking the jewel while holding
+    it applies it (alteration rerolls, augmentation adds a mod), and Ctrl+C over
+    the jewel puts its item text on the clipboard after COPY_LATENCY.
+    Holding Shift keeps the currency on the cursor, like the real client, and
+    releasing Shift drops it.
+
+    Unverified assumption: Ctrl+C copies the item while Shift is also held
+    (the game receives Ctrl+Shift+C in the "shift" workflow). This has not
+    been checked against the real client, so a "shift" run here only shows
+    the worker's side of the workflow.
+    """
+
+    name = "sim"
+
+    def __init__(self, pool, rng, alt_pos, cluster_pos, item2_pos=None, offset=OFFSET):
+        self.pool = pool
+        self.rng = rng
+        self.alt_pos = alt_pos
+        self.cluster_pos = cluster_pos
+        self.item2_pos = item2_pos
+        self.offset = offset
+        self.lock = threading.Lock()
+
+        self.cursor = (0, 0)
+        self.keys_down = set()
+        self.holding = None
+        self.jewel = []                  # [(Mod, values)]
+        self.target_check = lambda jewel: False
+
+        self.clipboard = ""
+        self.clipboard_truth = False     # ground truth of the text on the clipboard
+        self.sequence = 0
+        self.pending = None              # (ready_at, text, truth)
+
+        self.applied = 0                 # currency applications that changed the jewel
+        self.copies = 0
+        self.wasted_clicks = 0           # clicks that did nothing in the game
+        self.alerts = []
+
+    # --- game logic ---
+
+    def _over(self, pos):
+        return (
+            pos is not None
+            and abs(self.cursor[0] - pos[0]) <= self.offset
+            and abs(self.cursor[1] - pos[1]) <= self.offset
+        )
+
+    def _roll_mod(self, exclude):
+        while True:
+            mod = self.rng.choice(self.pool)
+            if mod not in exclude:
+                break
+        values = tuple(
+            self.rng.randint(*VALUE_RANGE) for _ in range(mod.strings[0].count("#"))
+        )
+        return mod, values
+
+    def _apply(self, currency):
+        if currency == "alteration":
+            count = self.rng.randint(*MODS_PER_JEWEL)
+            self.jewel = []
+            for _ in range(count):
+                self.jewel.append(self._roll_mod([m for m, _ in self.jewel]))
+            return True
+        if currency == "augmentation" and len(self.jewel) < MODS_PER_JEWEL[1]:
+            self.jewel.append(self._roll_mod([m for m, _ in self.jewel]))
+            return True
+        return False
+
+    def item_text(self):
+        lines = []
+        for mod, values in self.jewel:
+            text = mod.strings[0]
+            for value in values:
+                text = text.replace("#", str(value), 1)
+            lines.append(text.strip())
+        return "\n--------\n".join([
+            "物品種類: 珠寶\n稀有度: 魔法\n大型星團珠寶",
+            "需求:\n等級: 54",
+            "物品等級: 84",
+            "附加 8 個天賦 (enchant)\n附加的小天賦給予：12% 火焰傷害增加 (enchant)",
+            "\n".join(lines),
+            "放置於天賦樹上已配置的大型珠寶插槽。",
+        ]) + "\n"
+
+    # --- backend interface: pointer ---
+
+    def move(self, x, y):
+        with self.lock:
+            self.cursor = (x, y)
+
+    def click(self, button):
+        with self.lock:
+            if button == "right":
+                if self._over(self.alt_pos):
+                    self.holding = "alteration"
+                elif self._over(self.item2_pos):
+                    self.holding = "augmentation"
+                else:
+                    self.wasted_clicks += 1
+                return
+            if self.holding and self._over(self.cluster_pos):
+                if self._apply(self.holding):
+                    self.applied += 1
+                else:
+                    self.wasted_clicks += 1
+                if "shift" not in self.keys_down:
+                    self.holding = None
+            else:
+                self.wasted_clicks += 1
+
+    def position(self):
+        return self.cursor
+
+    # --- backend interface: keys ---
+
+    def key_down(self, key):
+        with self.lock:
+            self.keys_down.add(key)
+
+    def key_up(self, key):
+        with self.lock:
+            self.keys_down.discard(key)
+            if key == "shift":
+                self.holding = None
+
+    def press(self, key):
+        with self.lock:
+            if key != "c" or "ctrl" not in self.keys_down or not self._over(self.cluster_pos):
+                return
+            self.copies += 1
+            ready_at = time.perf_counter() + COPY_LATENCY + self.rng.uniform(0, COPY_JITTER)
+            self.pending = (ready_at, self.item_text(), self.target_check(self.jewel))
+
+    # --- backend interface: clipboard ---
+
+    def _deliver(self):
+        if self.pending is not None and time.perf_counter() >= self.pending[0]:
+            _, self.clipboard, self.clipboard_truth = self.pending
+            self.pending = None
+            self.sequence += 1
+
+    def clipboard_sequence(self):
+        with self.lock:
+            self._deliver()
+            return self.sequence
+
+    def paste(self):
+        with self.lock:
+            self._deliver()
+            return self.clipboard
+
+    def copy(self, text):
+        with self.lock:
+            self.clipboard = text
+            self.sequence += 1
+
+    # --- backend interface: alert ---
+
+    def alert(self, text):
+        self.alerts.append(text)
+
+
+def pick_targets(pool, rng):
+    """Random targets; about half of the ones with a value get a minimum."""
+    targets = []
+    for mod in rng.sample(pool, TARGET_COUNT):
+        target = {"mod": mod, "min": None, "max": None}
+        if "#" in mod.strings[0] and rng.random() < 0.5:
+            target["min"] = rng.randint(*VALUE_RANGE)
+        targets.append(target)
+    return targets
+
+
+def make_target_check(targets, require_k):
+    """Ground truth from the rolled mods themselves (no text matching)."""
+    required = len(targets) if require_k is None else require_k
+
+    def check(jewel):
+        hits = 0
+        for target in targets:
+            for mod, values in jewel:
+                if mod is not target["mod"]:
+                    continue
+                value = values[0] if values else None
+                if value is not None:
+                    if target["min"] is not None and value < target["min"]:
+                        continue
+                    if target["max"] is not None and value > target["max"]:
+                        continue
+                hits += 1
+                break
+        return hits >= required
+
+    return check
+
+
+def run_worker(game, matcher, stop_after=None):
+    """Run worker_loop once on a thread; returns (rolls, seconds, stop latency)."""
+    result = {}
+    done = threading.Event()
+    gui_vars = {
+        "alt_pos": ALT_POS,
+        "cluster_pos": CLUSTER_POS,
+        "item2_pos": ITEM2_POS if WORKFLOW == "double" else None,
+        "workflow": WORKFLOW,
+        "offset": OFFSET,
+        "click_delay": CLICK_DELAY,
+        "copy_delay": COPY_DELAY,
+        "loop_delay": LOOP_DELAY,
+        "step_delays": STEP_DELAYS,
+        "matcher": matcher,
+        "append_log": lambda msg: None,
+        "set_count": lambda count: result.__setitem__("rolls", count),
+        "on_stop": done.set,
+    }
+    cluster_core.use_backend(game)
+    worker = threading.Thread(target=cluster_core.worker_loop, args=(gui_vars,), daemon=True)
+    started = time.perf_counter()
+    worker.start()
+
+    stop_latency = None
+    if stop_after is not None:
+        time.sleep(stop_after)
+        stopped = time.perf_counter()
+        cluster_core.stop_event.set()
+        worker.join()
+        stop_latency = time.perf_counter() - stopped
+    elif not done.wait(TRIAL_TIMEOUT):
+        cluster_core.stop_event.set()
+        worker.join()
+    worker.join()
+    return result.get("rolls", 0), time.perf_counter() - started, stop_latency
+
+
+def main():
+    if not MOD_FILE.exists():
+        print(f"Input file not found: {MOD_FILE}")
+        return
+
+    # Keep the simulated rolls out of the real roll_log.txt
+    log_dir = tempfile.TemporaryDirectory()
+    cluster_core.LOG_FILE = str(Path(log_dir.name) / "roll_log.txt")
+
+    rng = random.Random(SEED)
+    pool = cluster_core.load_mod_list(str(MOD_FILE), load_filter_keywords())
+    if not pool:
+        print("No mods left after filtering, nothing to simulate.")
+        return
+    print(f"Pool: {len(pool)} mods, workflow={WORKFLOW}, copy latency={COPY_LATENCY}s")
+
+    game = SimulatedGame(
+        pool, rng, ALT_POS, CLUSTER_POS, ITEM2_POS if WORKFLOW == "double" else None
+    )
+
+    # Phase 1: hit trials -> throughput and hit-detection accuracy
+    confusion = {"tp": 0, "fp": 0, "fn": 0, "tn": 0}
+    total_rolls = 0
+    total_seconds = 0.0
+    timeouts = 0
+    for _ in range(HIT_TRIALS):
+        targets = pick_targets(pool, rng)
+        game.target_check = make_target_check(targets, REQUIRE_K)
+        base_matcher = cluster_core.TargetMatcher(targets, REQUIRE_K)
+
+        def matcher(mod_lines):
+            hit, details = base_matcher(mod_lines)
+            truth = game.clipboard_truth
+            key = ("t" if hit == truth else "f") + ("p" if hit else "n")
+            confusion[key] += 1
+            return hit, details
+
+        rolls, seconds, _ = run_worker(game, matcher)
+        total_rolls += rolls
+        total_seconds += seconds
+        if not game.alerts:
+            timeouts += 1
+        game.alerts.clear()
+
+    # Phase 2: stop latency with targets that can never hit
+    never = [{"mod": pool[0], "min": VALUE_RANGE[1] + 1, "max": None}]
+    if "#" not in pool[0].strings[0]:
+        never = []
+    stop_matcher = cluster_core.TargetMatcher(never)
+    latencies = []
+    for _ in range(STOP_TRIALS):
+        _, _, latency = run_worker(game, stop_matcher, rng.uniform(*STOP_AFTER))
+        latencies.append(latency)
+
+    decisions = sum(confusion.values())
+    wrong = confusion["fp"] + confusion["fn"]
+    print()
+    print(f"Rolls: {total_rolls} in {total_seconds:.2f}s "
+          f"-> {total_rolls / total_seconds:.1f} rolls/s" if total_seconds else "Rolls: 0")
+    print(f"Game: {game.applied} currency applications, {game.copies} copies, "
+          f"{game.wasted_clicks} wasted clicks")
+    print(f"Hit trials: {HIT_TRIALS} ({timeouts} timed out after {TRIAL_TIMEOUT}s)")
+    print(f"Detection: tp={confusion['tp']} fp={confusion['fp']} "
+          f"fn={confusion['fn']} tn={confusion['tn']} "
+          f"accuracy={1 - wrong / decisions:.4f}" if decisions else "Detection: no decisions")
+    print(f"Stop latency: median {statistics.median(latencies) * 1000:.1f} ms, "
+          f"max {max(latencies) * 1000:.1f} ms over {STOP_TRIALS} stops")
+    cluster_core.close_roll_log()
+    log_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()